@@ -1,15 +1,513 @@
 import os
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import logging
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
 import redis.asyncio as redis
 from redis.asyncio import Redis
 
+from app.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT", "2"))
+# Сколько ждать свободного соединения, когда пул исчерпан
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+
+# Один пул соединений на процесс. Создается в lifespan приложения.
+_pool: redis.BlockingConnectionPool | None = None
+
+
+def init_redis_pool() -> redis.BlockingConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = redis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            timeout=REDIS_POOL_TIMEOUT,
+            encoding="utf-8",
+            decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+        )
+    return _pool
+
+
+async def close_redis_pool() -> None:
+    global _pool
+    pool, _pool = _pool, None
+    if pool is not None:
+        await pool.aclose()
+
+
+def get_redis_pool_stats() -> dict[str, int]:
+    """
+    Использование пула соединений Redis, чтобы подобрать REDIS_MAX_CONNECTIONS.
+    """
+    if _pool is None:
+        return {"max_connections": REDIS_MAX_CONNECTIONS, "in_use": 0, "idle": 0}
+    return {
+        "max_connections": _pool.max_connections,
+        "in_use": len(_pool._in_use_connections),
+        "idle": len(_pool._available_connections),
+    }
+
 
 async def get_redis_client() -> Redis:
     """
-    Provides an asynchronous Redis client.
+    Provides an asynchronous Redis client backed by the shared connection pool.
+    """
+    return Redis(connection_pool=init_redis_pool())
+
+
+class LRUCache:
+    """
+    Ограниченный in-process кэш: вытесняет давно не использованные записи
+    и не отдает записи старше ttl секунд. maxsize <= 0 отключает кэш.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Как часто слушатель инвалидаций проверяет, не пора ли остановиться
+INVALIDATION_POLL_INTERVAL = float(os.getenv("INVALIDATION_POLL_INTERVAL", "0.5"))
+INVALIDATION_STOP_TIMEOUT = float(os.getenv("INVALIDATION_STOP_TIMEOUT", "5"))
+
+
+class InvalidationListener:
+    """
+    Слушает канал, по которому воркеры рассылают сброс локальных кэшей
+    (сообщения - JSON), и переподключается при сбоях. Пока подписки нет,
+    сообщения теряются, поэтому после сбоя вызывается on_failure.
+
+    Сообщения читаются через get_message с таймаутом, а остановка - флаг,
+    который проверяется между чтениями: отмена задачи, заблокированной
+    в чтении из сокета, может не дойти до нее.
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        on_message: Callable[[Any], None],
+        on_failure: Callable[[], None],
+        poll_interval: float = INVALIDATION_POLL_INTERVAL,
+    ):
+        self.channel = channel
+        self.on_message = on_message
+        self.on_failure = on_failure
+        self.poll_interval = poll_interval
+        self._task: asyncio.Task | None = None
+        self._pubsub = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, redis: Redis) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run(redis))
+
+    async def stop(self, timeout: float = INVALIDATION_STOP_TIMEOUT) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stopping = True
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+        if done:
+            return
+        logger.warning(f"Listener of {self.channel} did not stop in time, cancelled")
+        task.cancel()
+        # Закрываем соединение под задачей, чтобы чтение из сокета прервалось
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None and pubsub.connection is not None:
+            await pubsub.connection.disconnect()
+
+    async def _run(self, redis: Redis) -> None:
+        while not self._stopping:
+            pubsub = None
+            try:
+                pubsub = self._pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.channel)
+                while not self._stopping:
+                    message = await pubsub.get_message(timeout=self.poll_interval)
+                    if message is not None:
+                        self.on_message(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._stopping:
+                    break
+                logger.warning(f"Subscription to {self.channel} failed: {e}")
+                self.on_failure()
+                await asyncio.sleep(1)
+            finally:
+                self._pubsub = None
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+
+# Теги кэша: каждая закэшированная запись регистрируется в множествах tag:<тег>,
+# а запись в БД инвалидирует ровно те записи, что висят на затронутых тегах.
+PRODUCTS_TAG = "products"
+# Страницы с сортировкой не по id: изменение цены или названия любого товара
+# может перенести его на другую страницу
+PRODUCTS_SORTED_TAG = "products_sorted"
+# Результаты поиска: любое изменение товара может изменить выдачу любого запроса
+PRODUCT_SEARCH_TAG = "product_search"
+
+# Собирает ключи из всех множеств тегов и удаляет их вместе с самими множествами
+# за один round-trip.
+_INVALIDATE_TAGS_SCRIPT = """
+local keys = {}
+for _, tag in ipairs(KEYS) do
+    for _, key in ipairs(redis.call('SMEMBERS', tag)) do
+        keys[#keys + 1] = key
+    end
+    keys[#keys + 1] = tag
+end
+for i = 1, #keys, 500 do
+    redis.call('UNLINK', unpack(keys, i, math.min(i + 499, #keys)))
+end
+return #keys
+"""
+
+
+def _tag_key(tag: str) -> str:
+    return f"tag:{tag}"
+
+
+def product_tag(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+async def cache_set_tagged(
+    redis: Redis,
+    key: str,
+    value: str,
+    ttl: int,
+    tags: list[str] = (),
+    meta: str | None = None,
+) -> None:
+    """
+    Сохраняет значение (и, если передано, его метаданные) и регистрирует
+    ключи под тегами одним pipeline.
+    """
+    keys = [key]
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(key, value, ex=ttl)
+        if meta is not None:
+            keys.append(_meta_key(key))
+            pipe.set(_meta_key(key), meta, ex=ttl)
+        for tag in tags:
+            # Множество тега живет не меньше, чем любая из его записей
+            pipe.sadd(_tag_key(tag), *keys)
+            pipe.expire(_tag_key(tag), ttl)
+        await pipe.execute()
+
+
+async def invalidate_tags(redis: Redis, *tags: str) -> None:
+    if not tags:
+        return
+    await redis.eval(
+        _INVALIDATE_TAGS_SCRIPT, len(tags), *(_tag_key(tag) for tag in tags)
+    )
+
+
+# Инвалидация кэша списков заказов:
+#   "version" - номер поколения пользователя входит в ключ, запись увеличивает его одним INCR,
+#               старые записи просто истекают по TTL;
+#   "tags"    - страницы регистрируются под тегом orders:<user_id> и удаляются сразу;
+#   "scan"    - запасной режим: поиск ключей через SCAN и удаление через UNLINK.
+ORDERS_CACHE_INVALIDATION = os.getenv("ORDERS_CACHE_INVALIDATION", "version")
+
+
+def _orders_version_key(user_id: int) -> str:
+    return f"orders_version:{user_id}"
+
+
+def orders_tag(user_id: int) -> str:
+    return f"orders:{user_id}"
+
+
+def orders_cache_tags(user_id: int) -> list[str]:
+    if ORDERS_CACHE_INVALIDATION == "tags":
+        return [orders_tag(user_id)]
+    return []
+
+
+async def orders_cache_key(
+    redis: Redis,
+    user_id: int,
+    status: str | None,
+    skip: int,
+    limit: int,
+    after_id: int | None = None,
+) -> str:
+    page = skip if after_id is None else f"after:{after_id}"
+    if ORDERS_CACHE_INVALIDATION in ("tags", "scan"):
+        return f"orders:{user_id}:{status}:{page}:{limit}"
+
+    version = await redis.get(_orders_version_key(user_id)) or 0
+    return f"orders:{user_id}:v{version}:{status}:{page}:{limit}"
+
+
+async def invalidate_user_orders(redis: Redis, user_id: int) -> None:
+    if ORDERS_CACHE_INVALIDATION == "tags":
+        await invalidate_tags(redis, orders_tag(user_id))
+    elif ORDERS_CACHE_INVALIDATION == "scan":
+        batch = []
+        async for key in redis.scan_iter(match=f"orders:{user_id}:*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                await redis.unlink(*batch)
+                batch = []
+        if batch:
+            await redis.unlink(*batch)
+    else:
+        await redis.incr(_orders_version_key(user_id))
+
+    # После сброса кэша, чтобы новый ETag никогда не отдавался со старым телом
+    await bump_change_counter(redis, orders_changes(user_id))
+
+
+async def invalidate_products(redis: Redis, *tags: str) -> None:
+    await invalidate_tags(redis, *tags, PRODUCT_SEARCH_TAG)
+    await bump_change_counter(redis, PRODUCTS_CHANGES)
+
+
+# Счетчики изменений для ETag. Пропавший счетчик (FLUSHALL, вытеснение)
+# заводится заново от текущего времени, а не с нуля, чтобы новые ETag
+# не совпали с выданными клиентам раньше.
+PRODUCTS_CHANGES = "products"
+
+
+def orders_changes(user_id: int) -> str:
+    return f"orders:{user_id}"
+
+
+def _changes_key(scope: str) -> str:
+    return f"changes:{scope}"
+
+
+async def get_change_counter(redis: Redis, scope: str) -> int:
+    key = _changes_key(scope)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.set(key, time.time_ns(), nx=True)
+        pipe.get(key)
+        _, value = await pipe.execute()
+    return int(value)
+
+
+async def bump_change_counter(redis: Redis, scope: str) -> int:
+    key = _changes_key(scope)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.set(key, time.time_ns(), nx=True)
+        pipe.incr(key)
+        _, value = await pipe.execute()
+    return value
+
+
+# Защита от "стампида" при истечении горячих ключей:
+#   - одновременные промахи по ключу в процессе ждут одного asyncio.Future,
+#     а между процессами - короткую блокировку в Redis;
+#   - после логического истечения значение еще CACHE_STALE_TTL секунд отдается
+#     устаревшим, пока ровно один обработчик его пересчитывает;
+#   - вероятностное раннее истечение (XFetch): чем дороже пересчет, тем раньше
+#     до истечения один из запросов начнет его.
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "30"))
+CACHE_LOCK_TTL_MS = int(os.getenv("CACHE_LOCK_TTL_MS", "5000"))
+CACHE_EARLY_EXPIRATION_BETA = float(os.getenv("CACHE_EARLY_EXPIRATION_BETA", "1.0"))
+# Как часто процесс без блокировки проверяет, не появилось ли значение
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Загрузчик возвращает сериализованное значение и теги, под которыми его хранить
+Loader = Callable[[], Awaitable[tuple[str, list[str]]]]
+
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def _meta_key(key: str) -> str:
+    return f"{key}:meta"
+
+
+def _lock_key(key: str) -> str:
+    return f"lock:{key}"
+
+
+def _parse_meta(meta) -> tuple[float, float]:
+    """Метаданные записи: момент логического истечения и время пересчета"""
+    if meta is None:
+        return 0.0, 0.0
+    if isinstance(meta, bytes):
+        meta = meta.decode()
+    expires_at, delta = meta.split(":")
+    return float(expires_at), float(delta)
+
+
+def _should_refresh(expires_at: float, delta: float, beta: float) -> bool:
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+async def _acquire_lock(redis: Redis, key: str) -> str | None:
+    token = uuid.uuid4().hex
+    if await redis.set(_lock_key(key), token, nx=True, px=CACHE_LOCK_TTL_MS):
+        return token
+    return None
+
+
+async def _release_lock(redis: Redis, key: str, token: str) -> None:
+    await redis.eval(_RELEASE_LOCK_SCRIPT, 1, _lock_key(key), token)
+
+
+async def _single_flight(key: str, compute: Callable[[], Awaitable[str]]) -> str:
+    """Все одновременные вызовы с одним ключом получают результат одного compute()"""
+    future = _inflight.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await compute()
+    except BaseException as e:
+        future.set_exception(e)
+        # Ошибку получат ожидающие, а если их нет - не шумим в логах
+        future.exception()
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        del _inflight[key]
+
+
+async def _load_and_store(
+    redis: Redis, key: str, loader: Loader, ttl: int, stale_ttl: int
+) -> str:
+    started = time.time()
+    value, tags = await loader()
+    delta = time.time() - started
+
+    meta = f"{started + delta + ttl}:{delta}"
+    await cache_set_tagged(redis, key, value, ttl + stale_ttl, tags=tags, meta=meta)
+    return value
+
+
+async def _load_on_miss(
+    redis: Redis, key: str, loader: Loader, ttl: int, stale_ttl: int
+) -> str:
+    token = await _acquire_lock(redis, key)
+    if token is None:
+        # Значение уже считает другой процесс: ждем его, пока жива блокировка
+        deadline = time.monotonic() + CACHE_LOCK_TTL_MS / 1000
+        while time.monotonic() < deadline:
+            await asyncio.sleep(CACHE_LOCK_POLL_INTERVAL)
+            value = await redis.get(key)
+            if value is not None:
+                return value
+        return await _load_and_store(redis, key, loader, ttl, stale_ttl)
+
+    try:
+        return await _load_and_store(redis, key, loader, ttl, stale_ttl)
+    finally:
+        await _release_lock(redis, key, token)
+
+
+async def _refresh_stale(
+    redis: Redis, key: str, loader: Loader, ttl: int, stale_ttl: int, stale: str
+) -> str:
+    token = await _acquire_lock(redis, key)
+    if token is None:
+        # Обновляет другой процесс - отдаем устаревшее значение
+        return stale
+    try:
+        return await _load_and_store(redis, key, loader, ttl, stale_ttl)
+    finally:
+        await _release_lock(redis, key, token)
+
+
+async def get_or_set(
+    redis: Redis,
+    key: str,
+    loader: Loader,
+    ttl: int,
+    stale_ttl: int = CACHE_STALE_TTL,
+    beta: float = CACHE_EARLY_EXPIRATION_BETA,
+) -> str:
+    """
+    Возвращает значение из кэша, при необходимости вызывая loader не более
+    одного раза на ключ во всем кластере.
     """
-    return redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+    value, meta = await redis.mget(key, _meta_key(key))
+
+    if value is None:
+        record_cache_lookup(key, "miss")
+        return await _single_flight(
+            key, lambda: _load_on_miss(redis, key, loader, ttl, stale_ttl)
+        )
+
+    expires_at, delta = _parse_meta(meta)
+    if not _should_refresh(expires_at, delta, beta):
+        record_cache_lookup(key, "hit")
+        return value
 
-# Optional: A global client instance if you prefer to manage the connection globally.
-# However, using a dependency injection approach with get_redis_client is often cleaner in FastAPI.
-# redis_client = redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
+    # Устаревшее или досрочно обновляемое значение отдается сразу
+    record_cache_lookup(key, "stale")
+    if key in _inflight:
+        # Этот процесс уже обновляет значение
+        return value
+    return await _single_flight(
+        key, lambda: _refresh_stale(redis, key, loader, ttl, stale_ttl, value)
+    )
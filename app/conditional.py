@@ -0,0 +1,33 @@
+import os
+
+from fastapi import Request, Response, status
+
+# Сколько секунд CDN может отдавать список товаров без перепроверки
+PRODUCTS_CDN_MAX_AGE = int(os.getenv("PRODUCTS_CDN_MAX_AGE", "30"))
+
+# Браузер всегда перепроверяет (дешево благодаря ETag), CDN держит s-maxage
+PUBLIC_CACHE_CONTROL = f"public, max-age=0, s-maxage={PRODUCTS_CDN_MAX_AGE}"
+# Заказы видит только владелец: общим кэшам хранить нельзя
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(scope: str, version: int) -> str:
+    return f'"{scope}-{version}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Совпадает ли ETag с If-None-Match (список через запятую, W/ и * допустимы).
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix("W/") for value in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
@@ -1,15 +1,133 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 import os
+import time
 from collections.abc import AsyncGenerator
 
+from app.metrics import observe_db_query
+
 DATABASE_URL = os.getenv(
     "DATABASE_URL", "postgresql+asyncpg://user:password@db:5432/simple_shop_db"
 )
 
-engine = create_async_engine(
-    DATABASE_URL, echo=True
-)  # echo=True для логирования SQL-запросов
+# Логирование каждого запроса синхронно и дорого, включать только для отладки
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# Пул соединений на процесс: pool_size постоянных + max_overflow временных
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Сколько ждать свободного соединения, прежде чем отдать ошибку
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Пересоздавать соединения старше N секунд (балансировщики рвут долгие соединения)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Кэш подготовленных выражений asyncpg; 0 для PgBouncer в режиме transaction
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+# statement_timeout на стороне PostgreSQL в миллисекундах, 0 - без ограничения
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул, который считает время ожидания свободного соединения: рост ожидания
+    при низкой загрузке CPU означает, что узкое место - БД или размер пула.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats["timeouts"] += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_stats["checkouts"] += 1
+            self.wait_stats["wait_seconds_total"] += waited
+            self.wait_stats["wait_seconds_max"] = max(
+                self.wait_stats["wait_seconds_max"], waited
+            )
+
+    def recreate(self):
+        # При dispose() пул пересоздается, статистику переносим
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+
+# Время запросов для всех движков (основная БД, реплика): слушатели на классе Engine
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    observe_db_query(statement, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_query_error(exception_context):
+    # Упавший запрос не доходит до after_cursor_execute
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def engine_options(url: str) -> dict:
+    options = {"echo": DB_ECHO}
+    if url.startswith("sqlite"):
+        # SQLite (тесты, бенчмарки) использует пул по умолчанию
+        return options
+
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    if url.startswith("postgresql+asyncpg"):
+        connect_args = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["server_settings"] = {
+                "statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)
+            }
+        options["connect_args"] = connect_args
+    return options
+
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+
+
+def get_db_pool_stats(db_engine=None) -> dict:
+    """Размер и занятость пула соединений с БД и ожидание соединений"""
+    pool = (db_engine or engine).sync_engine.pool
+    if not isinstance(pool, TimedQueuePool):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        **pool.wait_stats,
+    }
 
 
 AsyncSessionLocal = async_sessionmaker(
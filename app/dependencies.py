@@ -1,21 +1,177 @@
-from fastapi import Depends, HTTPException, status
+import os
+import json
+import asyncio
+import logging
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from redis.asyncio import Redis
 from app.database import get_async_session
 from app.models import User
+from app.cache import (
+    INVALIDATION_STOP_TIMEOUT,
+    InvalidationListener,
+    LRUCache,
+    get_redis_client,
+)
+from app.replica import mark_recent_write
 from app.security import decode_access_token
 from app.schemas.token import TokenData
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/login")
 
+# Кэш аутентифицированных пользователей, чтобы не ходить в users на каждый запрос.
+# TTL ограничивает время, в течение которого другие воркеры могут видеть старые данные.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "30"))
+# Дополнительный общий слой в Redis за in-process кэшем
+AUTH_CACHE_REDIS = os.getenv("AUTH_CACHE_REDIS", "false").lower() == "true"
+PRINCIPAL_INVALIDATION_CHANNEL = "principal_invalidations"
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Минимальные данные текущего пользователя, не привязанные к сессии БД"""
+
+    id: int
+    email: str
+    is_active: bool
+
+
+principal_cache = LRUCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+
+def _principal_key(email: str) -> str:
+    return f"principal:{email}"
+
+
+class PrincipalInvalidator:
+    """
+    Сбрасывает пользователей из кэшей всех воркеров: удаляет общую запись
+    в Redis и рассылает email через pub/sub, как ProductCache. До start()
+    (скрипты, тесты без lifespan) сбрасывается только LRU процесса.
+    """
+
+    def __init__(self):
+        self._redis: Redis | None = None
+        self._listener = InvalidationListener(
+            PRINCIPAL_INVALIDATION_CHANNEL, self._drop_local, principal_cache.clear
+        )
+        self._pending: set[asyncio.Task] = set()
+
+    def evict(self, emails: Iterable[str]) -> None:
+        emails = list(emails)
+        self._drop_local(emails)
+        if self._redis is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._broadcast(self._redis, emails))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _broadcast(self, redis: Redis, emails: list[str]) -> None:
+        try:
+            if AUTH_CACHE_REDIS:
+                await redis.delete(*(_principal_key(email) for email in emails))
+            await redis.publish(PRINCIPAL_INVALIDATION_CHANNEL, json.dumps(emails))
+        except Exception as e:
+            # Остальные воркеры увидят изменение не позже AUTH_CACHE_TTL
+            logger.warning(f"Principal invalidation failed: {e}")
+
+    def _drop_local(self, emails: Iterable[str]) -> None:
+        for email in emails:
+            principal_cache.pop(email)
+
+    def start(self, redis: Redis) -> None:
+        self._redis = redis
+        self._listener.start(redis)
+
+    async def stop(self, timeout: float = INVALIDATION_STOP_TIMEOUT) -> None:
+        self._redis = None
+        await self._listener.stop(timeout)
+        if self._pending:
+            await asyncio.wait(self._pending, timeout=timeout)
+
+
+principal_invalidator = PrincipalInvalidator()
+
+# Пользователи, у которых в транзакции сессии изменился is_active
+_CHANGED_PRINCIPALS = "changed_principals"
+
+
+@event.listens_for(User.is_active, "set")
+def _on_user_active_changed(target, value, oldvalue, initiator):
+    # Сбрасывать кэши можно только после commit: до него другой запрос
+    # снова прочитал бы из БД старую строку
+    if target.email is None:
+        return
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED_PRINCIPALS, set()).add(target.email)
+    else:
+        principal_cache.pop(target.email)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_changed_principals(session):
+    emails = session.info.pop(_CHANGED_PRINCIPALS, None)
+    if emails:
+        principal_invalidator.evict(emails)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_principals(session):
+    session.info.pop(_CHANGED_PRINCIPALS, None)
+
+
+async def _load_principal(
+    email: str, db: AsyncSession, redis: Redis
+) -> Principal | None:
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+
+    if AUTH_CACHE_REDIS:
+        cached = await redis.get(_principal_key(email))
+        if cached:
+            principal = Principal(**json.loads(cached))
+            principal_cache.set(email, principal)
+            return principal
+
+    user_result = await db.execute(
+        select(User.id, User.email, User.is_active).where(User.email == email)
+    )
+    row = user_result.first()
+    if row is None:
+        return None
+
+    principal = Principal(id=row.id, email=row.email, is_active=bool(row.is_active))
+    principal_cache.set(email, principal)
+    if AUTH_CACHE_REDIS:
+        await redis.set(
+            _principal_key(email), json.dumps(asdict(principal)), ex=AUTH_CACHE_TTL
+        )
+    return principal
+
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_session)
-):
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_session),
+    redis: Redis = Depends(get_redis_client),
+) -> Principal:
     token_data = decode_access_token(token)
-    user_result = await db.execute(select(User).where(User.email == token_data.email))
-    current_user = user_result.scalars().first()
+    current_user = await _load_principal(token_data.email, db, redis)
 
     if current_user is None:
         raise HTTPException(
@@ -27,10 +183,16 @@ async def get_current_user(
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
+
+    # Изменяющий запрос: ближайшие чтения этого пользователя не идут в реплику
+    if request.method not in ("GET", "HEAD"):
+        await mark_recent_write(redis, current_user.email)
     return current_user
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_active_user(
+    current_user: Principal = Depends(get_current_user),
+) -> Principal:
     return current_user
 
 
@@ -0,0 +1,80 @@
+import io
+import os
+import csv
+import enum
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+from typing import Literal
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Сколько строк за раз забирается из серверного курсора и уходит клиенту одним чанком
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "1000"))
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _csv_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _encode_ndjson(columns: list[str], rows) -> bytes:
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=_json_default) + "\n"
+        for row in rows
+    ).encode()
+
+
+def _encode_csv(columns: list[str], rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_csv_value(v) for v in row] for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def stream_rows(
+    db: AsyncSession, query: Select, fmt: ExportFormat
+) -> AsyncIterator[bytes]:
+    """
+    Читает строки из серверного курсора пачками по EXPORT_FETCH_SIZE.
+    Следующая пачка не читается, пока клиент не принял предыдущую.
+    """
+    result = await db.stream(query.execution_options(yield_per=EXPORT_FETCH_SIZE))
+    columns = list(result.keys())
+    if fmt == "csv":
+        yield _encode_csv(columns, [columns])
+    encode = _encode_csv if fmt == "csv" else _encode_ndjson
+    async for rows in result.partitions():
+        yield encode(columns, rows)
+
+
+def export_response(
+    db: AsyncSession, query: Select, fmt: ExportFormat, filename: str
+) -> StreamingResponse:
+    """
+    Ответ с выгрузкой. Запрос должен выбирать колонки, а не ORM-объекты:
+    так строки не попадают в identity map сессии.
+    """
+    # Сессия из зависимости закрывается после отправки ответа (FastAPI >= 0.118)
+    return StreamingResponse(
+        stream_rows(db, query, fmt),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
@@ -1,6 +1,25 @@
-from fastapi import FastAPI
+import logging
+from contextlib import asynccontextmanager
 
+from fastapi import FastAPI, Response
+from redis.asyncio import Redis
+
+from app.broker import publisher
+from app.cache import (
+    close_redis_pool,
+    get_redis_pool_stats,
+    init_redis_pool,
+)
+from app.database import get_db_pool_stats
+from app.dependencies import principal_invalidator
+from app.metrics import MetricsMiddleware, register_stats_collector, render_metrics
+from app.outbox import outbox_relay
+from app.product_cache import product_cache
+from app.replica import replica_monitor
 from app.routers import auth, orders, products
+from app.security import shutdown_hash_executor
+
+logger = logging.getLogger(__name__)
 
 # Описание тегов для группировки в Swagger UI
 tags_metadata = [
@@ -18,6 +37,35 @@ tags_metadata = [
     },
 ]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    redis = Redis(connection_pool=init_redis_pool())
+
+    # Одно соединение с RabbitMQ на процесс вместо подключения на каждое событие
+    try:
+        await publisher.start()
+    except Exception as e:
+        # Брокер может подняться позже: издатель подключится при первой отправке
+        logger.warning(f"RabbitMQ is not available on startup: {e}")
+
+    # События пишутся в outbox вместе с данными, отправляет их relay
+    outbox_relay.start()
+    # Изменения товаров в других воркерах сбрасывают локальный кэш этого
+    product_cache.start(redis)
+    # То же для пользователей, деактивированных в других воркерах
+    principal_invalidator.start(redis)
+    await replica_monitor.start()
+    yield
+    await replica_monitor.stop()
+    await principal_invalidator.stop()
+    await product_cache.stop()
+    await outbox_relay.stop()
+    await publisher.close()
+    await close_redis_pool()
+    shutdown_hash_executor()
+
+
 app = FastAPI(
     title="Simple Shop API",
     description="""
@@ -35,6 +83,7 @@ app = FastAPI(
         "name": "Support",
         "email": "support@verycoolsupport.com",
     },
+    lifespan=lifespan,
 )
 
 
@@ -43,6 +92,34 @@ async def root():
     return {"message": "Welcome to the Simple Shop API!"}
 
 
+def collect_stats() -> dict:
+    """Состояние пулов соединений и кэшей процесса"""
+    return {
+        "db_pool": get_db_pool_stats(),
+        "redis_pool": get_redis_pool_stats(),
+        "outbox_relay": outbox_relay.stats,
+        "product_cache": product_cache.snapshot(),
+        "replica": replica_monitor.snapshot(),
+    }
+
+
+@app.get("/stats", include_in_schema=False)
+async def stats():
+    return collect_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+# Те же значения, что в /stats, попадают в /metrics как gauge
+register_stats_collector(collect_stats)
+app.add_middleware(MetricsMiddleware)
+
+
 app.include_router(auth.router, prefix="/api", tags=["Auth"])
 app.include_router(products.router, prefix="/api", tags=["Products"])
 app.include_router(orders.router, prefix="/api", tags=["Orders"])
@@ -0,0 +1,189 @@
+import os
+import time
+from collections.abc import Callable
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Метрики можно выключить целиком; все хуки проверяют этот флаг
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Границы гистограмм: от долей миллисекунды (Redis, кэш) до секунд (bcrypt, отчеты)
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups in get_or_set by key namespace and result",
+    ["cache", "result"],
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+BROKER_PUBLISH_DURATION = Histogram(
+    "broker_publish_duration_seconds",
+    "RabbitMQ publish time including the publisher confirm",
+    ["event_type"],
+    buckets=LATENCY_BUCKETS,
+)
+PASSWORD_HASH_DURATION = Histogram(
+    "password_hash_duration_seconds",
+    "bcrypt time inside the hashing thread pool",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Hashing requests rejected with 503 because the pool queue was full",
+)
+
+_SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def sql_operation(statement: str) -> str:
+    # Ограниченный набор значений метки вместо текста запроса
+    operation = statement.lstrip()[:6].upper()
+    return operation if operation in _SQL_OPERATIONS else "OTHER"
+
+
+def cache_namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def record_cache_lookup(key: str, result: str) -> None:
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.labels(cache_namespace(key), result).inc()
+
+
+def observe_db_query(statement: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        DB_QUERY_DURATION.labels(sql_operation(statement)).observe(seconds)
+
+
+def observe_publish(event_type: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        BROKER_PUBLISH_DURATION.labels(event_type).observe(seconds)
+
+
+def observe_password_hash(operation: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        PASSWORD_HASH_DURATION.labels(operation).observe(seconds)
+
+
+def record_password_hash_rejected() -> None:
+    if METRICS_ENABLED:
+        PASSWORD_HASH_REJECTED.inc()
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Шаблон пути запроса, например /api/products/{product_id}. Маршруты
+    подключенных роутеров хранят путь без префикса, поэтому префикс берется
+    из начала фактического пути.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    depth = route.path.count("/")
+    prefix = "/".join(scope["path"].split("/")[:-depth])
+    return prefix + route.path
+
+
+class MetricsMiddleware:
+    """
+    Чистое ASGI-middleware (без BaseHTTPMiddleware): один замер времени
+    и одно observe на запрос. Метка route - шаблон пути, а не сам путь,
+    чтобы число временных рядов не росло с числом id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], route_template(scope), str(status_code)
+            ).observe(time.perf_counter() - started)
+
+
+class StatsCollector(Collector):
+    """
+    Отдает значения из /stats (пулы, outbox, кэши) как gauge в момент
+    опроса, не добавляя работы на горячем пути.
+    """
+
+    def __init__(self, stats: Callable[[], dict]):
+        self.stats = stats
+
+    def collect(self):
+        for name, value in _flatten("shop", self.stats()):
+            gauge = GaugeMetricFamily(name, f"/stats value {name}")
+            gauge.add_metric([], float(value))
+            yield gauge
+
+
+def _flatten(prefix: str, values: dict):
+    for key, value in values.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, (int, float)):
+            yield name, value
+
+
+_stats_collectors: list[StatsCollector] = []
+
+
+def register_stats_collector(stats: Callable[[], dict]) -> None:
+    collector = StatsCollector(stats)
+    REGISTRY.register(collector)
+    _stats_collectors.append(collector)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Несколько воркеров uvicorn: собираем значения всех процессов
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        # Gauge из /stats не пишутся в файлы воркеров: отдаем значения
+        # процесса, который отвечает на запрос
+        for collector in _stats_collectors:
+            registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -23,6 +23,15 @@ if config.config_file_name is not None:
 
 target_metadata = Base.metadata
 
+# Объекты только для PostgreSQL, которых нет в моделях (см. app/search.py):
+# autogenerate не должен предлагать их удалить
+UNMANAGED_OBJECTS = {"search_vector", "ix_products_search_vector"}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    return not (reflected and name in UNMANAGED_OBJECTS)
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -45,6 +54,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -57,6 +67,7 @@ def do_run_migrations(connection: Connection) -> None:
     context.configure(
         connection=connection,
         target_metadata=target_metadata,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -0,0 +1,30 @@
+"""keyset pagination indexes
+
+Revision ID: 3f9a6c2d1b7e
+Revises: ab894a987f0f
+Create Date: 2026-10-18 10:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a6c2d1b7e'
+down_revision: Union[str, Sequence[str], None] = 'ab894a987f0f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_orders_user_id_id', 'orders', ['user_id', 'id'], unique=False)
+    op.create_index('ix_orders_user_id_status_id', 'orders', ['user_id', 'status', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_orders_user_id_status_id', table_name='orders')
+    op.drop_index('ix_orders_user_id_id', table_name='orders')
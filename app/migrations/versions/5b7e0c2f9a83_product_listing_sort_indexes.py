@@ -0,0 +1,32 @@
+"""product listing sort indexes
+
+Revision ID: 5b7e0c2f9a83
+Revises: e8d05b3a7c41
+Create Date: 2026-10-18 18:47:30.216593
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e0c2f9a83'
+down_revision: Union[str, Sequence[str], None] = 'e8d05b3a7c41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_products_price_id', 'products', ['price', 'id'], unique=False)
+    op.create_index('ix_products_name_id', 'products', ['name', 'id'], unique=False)
+    op.drop_index('ix_products_name', table_name='products')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_products_name', 'products', ['name'], unique=False)
+    op.drop_index('ix_products_name_id', table_name='products')
+    op.drop_index('ix_products_price_id', table_name='products')
@@ -0,0 +1,33 @@
+"""orders product_id index
+
+Revision ID: 9c3d7a1e5f20
+Revises: 5b7e0c2f9a83
+Create Date: 2026-10-18 19:31:54.672048
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3d7a1e5f20'
+down_revision: Union[str, Sequence[str], None] = '5b7e0c2f9a83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в orders, но не работает в транзакции.
+    # Прерванная сборка оставляет невалидный индекс, поэтому сначала удаляем его
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_orders_product_id'), table_name='orders', postgresql_concurrently=True, if_exists=True)
+        op.create_index(op.f('ix_orders_product_id'), 'orders', ['product_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_orders_product_id'), table_name='orders', postgresql_concurrently=True)
@@ -0,0 +1,59 @@
+"""order price snapshot and user order stats
+
+Revision ID: e2a7f4c913b6
+Revises: c41e8b5a9d02
+Create Date: 2026-10-18 16:05:42.390127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a7f4c913b6'
+down_revision: Union[str, Sequence[str], None] = 'c41e8b5a9d02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('orders', sa.Column('unit_price', sa.Numeric(precision=12, scale=2), nullable=True))
+    op.add_column('orders', sa.Column('total', sa.Numeric(precision=14, scale=2), nullable=True))
+    # Для старых заказов цена покупки неизвестна: берем текущую цену товара
+    op.execute("""
+        UPDATE orders
+        SET unit_price = round(products.price::numeric, 2),
+            total = round(products.price::numeric, 2) * orders.quantity
+        FROM products
+        WHERE products.id = orders.product_id
+    """)
+    op.alter_column('orders', 'unit_price', nullable=False)
+    op.alter_column('orders', 'total', nullable=False)
+
+    op.create_table('user_order_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('total_spent', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('last_order_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.execute("""
+        INSERT INTO user_order_stats (user_id, order_count, total_spent, last_order_at)
+        SELECT user_id,
+               count(*),
+               coalesce(sum(total) FILTER (WHERE status <> 'cancelled'), 0),
+               max(created_at)
+        FROM orders
+        GROUP BY user_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_order_stats')
+    op.drop_column('orders', 'total')
+    op.drop_column('orders', 'unit_price')
@@ -0,0 +1,36 @@
+"""product search vector
+
+Revision ID: e8d05b3a7c41
+Revises: e2a7f4c913b6
+Create Date: 2026-10-18 17:22:09.804615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8d05b3a7c41'
+down_revision: Union[str, Sequence[str], None] = 'e2a7f4c913b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Конфигурация 'simple' без стемминга: названия бывают на разных языках,
+    # а поиск идет по префиксам слов. Столбца нет в модели, см. app/search.py
+    op.execute("""
+        ALTER TABLE products
+        ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, name)) STORED
+    """)
+    op.create_index('ix_products_search_vector', 'products', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_search_vector', table_name='products', postgresql_using='gin')
+    op.drop_column('products', 'search_vector')
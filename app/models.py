@@ -3,10 +3,14 @@ from sqlalchemy import (
     Integer,
     String,
     Float,
+    Numeric,
     ForeignKey,
     DateTime,
     Enum,
     Boolean,
+    Index,
+    JSON,
+    text,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -37,22 +41,82 @@ class Product(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False)
+    name = Column(String, nullable=False)
     price = Column(Float, nullable=False)
 
     orders = relationship("Order", back_populates="product")
 
+    # Keyset-пагинация списка товаров с сортировкой по цене и по названию;
+    # (name, id) заменяет прежний индекс по одному name
+    __table_args__ = (
+        Index("ix_products_price_id", "price", "id"),
+        Index("ix_products_name_id", "name", "id"),
+    )
+
 
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    # Индекс нужен и проверке внешнего ключа при удалении товара
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     quantity = Column(Integer, default=1, nullable=False)
+    # Цена на момент покупки: история и суммы не зависят от текущей цены товара
+    unit_price = Column(Numeric(12, 2), nullable=False)
+    total = Column(Numeric(14, 2), nullable=False)
     status = Column(Enum(OrderStatus), default=OrderStatus.pending, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     user = relationship("User", back_populates="orders")
     product = relationship("Product", back_populates="orders")
+
+    # Keyset-пагинация списка заказов пользователя (с фильтром по статусу и без)
+    __table_args__ = (
+        Index("ix_orders_user_id_id", "user_id", "id"),
+        Index("ix_orders_user_id_status_id", "user_id", "status", "id"),
+    )
+
+
+class UserOrderStats(Base):
+    """
+    Сводка по заказам пользователя, обновляется вместе с заказами
+    (app/order_stats.py), чтобы не агрегировать всю историю при чтении.
+    """
+
+    __tablename__ = "user_order_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    order_count = Column(Integer, default=0, nullable=False)
+    # Сумма неотмененных заказов
+    total_spent = Column(Numeric(14, 2), default=0, nullable=False)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class OutboxEvent(Base):
+    """
+    Событие для RabbitMQ, записанное в той же транзакции, что и изменение данных.
+    Отправляет его фоновый relay (app/outbox.py).
+    """
+
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(String, nullable=True)
+
+    # Relay выбирает только неотправленные события, индекс по ним остается маленьким
+    __table_args__ = (
+        Index(
+            "ix_outbox_pending",
+            "id",
+            postgresql_where=text("sent_at IS NULL"),
+            sqlite_where=text("sent_at IS NULL"),
+        ),
+    )
@@ -0,0 +1,127 @@
+from collections.abc import Sequence
+from decimal import Decimal
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Order, OrderStatus, UserOrderStats
+
+CENTS = Decimal("0.01")
+
+
+def to_money(price: float) -> Decimal:
+    """
+    Цена товара хранится как float: переводим через строку, чтобы 19.99
+    стало Decimal("19.99"), а не двоичным приближением.
+    """
+    return Decimal(str(price)).quantize(CENTS)
+
+
+def _is_spent(status: OrderStatus | str) -> bool:
+    return OrderStatus(status) != OrderStatus.cancelled
+
+
+def _spent_delta(status: OrderStatus | str, total: Decimal) -> Decimal:
+    return total if _is_spent(status) else Decimal(0)
+
+
+async def record_orders_created(
+    db: AsyncSession, user_id: int, orders: Sequence[Order]
+) -> None:
+    """Учитывает новые заказы в сводке одним upsert (в транзакции заказов)"""
+    module = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    stmt = module.insert(UserOrderStats).values(
+        user_id=user_id,
+        order_count=len(orders),
+        total_spent=sum((_spent_delta(o.status, o.total) for o in orders), Decimal(0)),
+        last_order_at=max(o.created_at for o in orders),
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserOrderStats.user_id],
+            set_={
+                "order_count": UserOrderStats.order_count + stmt.excluded.order_count,
+                "total_spent": UserOrderStats.total_spent + stmt.excluded.total_spent,
+                "last_order_at": stmt.excluded.last_order_at,
+            },
+        )
+    )
+
+
+async def change_status(
+    db: AsyncSession, order_id: int, user_id: int, status: str
+) -> tuple[Order, OrderStatus] | None:
+    """
+    Меняет статус заказа пользователя и возвращает (заказ, прежний статус)
+    или None, если заказа нет.
+    """
+    if db.bind.dialect.name == "postgresql":
+        # Прежний статус читается с блокировкой строки в том же запросе
+        previous = (
+            select(Order.id, Order.status)
+            .where(Order.id == order_id, Order.user_id == user_id)
+            .with_for_update()
+            .cte("previous")
+        )
+        row = (
+            await db.execute(
+                update(Order)
+                .where(Order.id == previous.c.id)
+                .values(status=status)
+                .returning(Order, previous.c.status)
+                .execution_options(synchronize_session=False)
+            )
+        ).first()
+        return tuple(row) if row is not None else None
+
+    # SQLite не отдает в RETURNING столбцы других таблиц, зато пишет
+    # последовательно: прежний статус можно прочитать до UPDATE
+    old_status = await db.scalar(
+        select(Order.status).where(Order.id == order_id, Order.user_id == user_id)
+    )
+    if old_status is None:
+        return None
+    order = await db.scalar(
+        update(Order).where(Order.id == order_id).values(status=status).returning(Order)
+    )
+    return order, old_status
+
+
+async def record_status_changed(
+    db: AsyncSession,
+    user_id: int,
+    old_status: OrderStatus | str,
+    new_status: OrderStatus | str,
+    total: Decimal,
+) -> None:
+    """Сводка меняется, только если заказ отменили или вернули из отмены"""
+    delta = _spent_delta(new_status, total) - _spent_delta(old_status, total)
+    if delta:
+        await db.execute(
+            update(UserOrderStats)
+            .where(UserOrderStats.user_id == user_id)
+            .values(total_spent=UserOrderStats.total_spent + delta)
+        )
+
+
+async def record_order_deleted(
+    db: AsyncSession, user_id: int, status: OrderStatus | str, total: Decimal
+) -> None:
+    # Время последнего заказа берется по индексу (user_id, id), без агрегации
+    last_order_at = (
+        select(Order.created_at)
+        .where(Order.user_id == user_id)
+        .order_by(Order.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    await db.execute(
+        update(UserOrderStats)
+        .where(UserOrderStats.user_id == user_id)
+        .values(
+            order_count=UserOrderStats.order_count - 1,
+            total_spent=UserOrderStats.total_spent - _spent_delta(status, total),
+            last_order_at=last_order_at,
+        )
+    )
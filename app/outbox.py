@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.broker import Publisher, publisher
+from app.database import AsyncSessionLocal
+from app.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+# Как часто relay проверяет таблицу, если его не разбудили
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_RETRY_BASE_DELAY = float(os.getenv("OUTBOX_RETRY_BASE_DELAY", "1"))
+OUTBOX_RETRY_MAX_DELAY = float(os.getenv("OUTBOX_RETRY_MAX_DELAY", "300"))
+
+
+def add_event(db: AsyncSession, event_type: str, data: dict) -> None:
+    """
+    Добавляет событие в outbox текущей транзакции. Оно будет отправлено
+    в RabbitMQ, только если транзакция зафиксируется.
+    """
+    db.add(OutboxEvent(event_type=event_type, payload=data))
+
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка перед повторной отправкой"""
+    return min(OUTBOX_RETRY_BASE_DELAY * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_DELAY)
+
+
+class OutboxRelay:
+    """
+    Фоновая задача, которая пачками отправляет события из outbox в RabbitMQ.
+
+    Доставка "at least once": если процесс упадет между публикацией и commit,
+    событие уйдет повторно, поэтому обработчики должны быть идемпотентны.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = AsyncSessionLocal,
+        publisher: Publisher = publisher,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._stopping = False
+        self.stats = {
+            "published": 0,
+            "failed": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "last_batch_seconds": 0.0,
+            "events_per_second": 0.0,
+        }
+
+    async def drain_once(self) -> int:
+        """Отправляет одну пачку событий и возвращает ее размер"""
+        started = time.perf_counter()
+        async with self.session_factory() as session:
+            now = datetime.now(timezone.utc)
+            result = await session.execute(
+                select(OutboxEvent)
+                .where(
+                    OutboxEvent.sent_at.is_(None),
+                    or_(
+                        OutboxEvent.next_attempt_at.is_(None),
+                        OutboxEvent.next_attempt_at <= now,
+                    ),
+                )
+                .order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                # Несколько воркеров приложения не возьмут одни и те же строки
+                .with_for_update(skip_locked=True)
+            )
+            events = result.scalars().all()
+            if not events:
+                return 0
+
+            # Публикации с confirms идут параллельно по каналам издателя
+            results = await asyncio.gather(
+                *(self.publisher.publish(e.event_type, e.payload) for e in events),
+                return_exceptions=True,
+            )
+
+            published = 0
+            for event, error in zip(events, results):
+                if isinstance(error, BaseException):
+                    event.attempts += 1
+                    event.next_attempt_at = now + timedelta(
+                        seconds=retry_delay(event.attempts)
+                    )
+                    event.last_error = str(error)[:500]
+                else:
+                    event.sent_at = now
+                    published += 1
+            await session.commit()
+
+        elapsed = time.perf_counter() - started
+        self.stats["published"] += published
+        self.stats["failed"] += len(events) - published
+        self.stats["batches"] += 1
+        self.stats["last_batch_size"] = len(events)
+        self.stats["last_batch_seconds"] = round(elapsed, 6)
+        self.stats["events_per_second"] = round(published / elapsed, 1) if elapsed else 0.0
+        return len(events)
+
+    def notify(self) -> None:
+        """Будит relay сразу после commit, не дожидаясь очередного опроса"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            # Сбрасываем до отправки, чтобы не потерять notify() во время нее
+            self._wakeup.clear()
+            try:
+                drained = await self.drain_once()
+            except Exception as e:
+                logger.warning(f"Outbox relay failed: {e}")
+                drained = 0
+
+            if drained < self.batch_size and not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Дает дослать текущую пачку и останавливает relay"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbox relay did not stop in time, cancelled")
+        self._wakeup = None
+
+
+outbox_relay = OutboxRelay()
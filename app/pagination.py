@@ -0,0 +1,84 @@
+import hmac
+import base64
+import hashlib
+import json
+
+from fastapi import HTTPException, Response, status
+
+from app.security import SECRET_KEY
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode((value + "=" * (-len(value) % 4)).encode())
+
+
+def _signature(raw: bytes) -> str:
+    return _b64encode(hmac.new(SECRET_KEY.encode(), raw, hashlib.sha256).digest()[:12])
+
+
+def encode_cursor(**values) -> str:
+    """
+    Кодирует позицию последней строки страницы в непрозрачную строку.
+    Курсор подписан: позиция из него - всегда строка, которую выдал сервер,
+    поэтому страницы по курсору можно кэшировать.
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return f"{_b64encode(raw)}.{_signature(raw)}"
+
+
+def _is_int(value) -> bool:
+    # bool - подкласс int, но в курсоре это подделка
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        payload, _, signature = cursor.partition(".")
+        raw = _b64decode(payload)
+        if not hmac.compare_digest(signature.encode(), _signature(raw).encode()):
+            raise ValueError
+        values = json.loads(raw)
+        if not isinstance(values, dict) or not _is_int(values.get("id")):
+            raise ValueError
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    return values
+
+
+def next_cursor(items: list, limit: int, *keys: str) -> str | None:
+    """
+    Курсор следующей страницы (по ORM-объектам страницы) или None,
+    если эта страница последняя. keys - дополнительные поля сортировки.
+    """
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(id=last.id, **{key: getattr(last, key) for key in keys})
+
+
+def pack_page(body: bytes, cursor: str | None) -> bytes:
+    """
+    Значение для кэша: первая строка - курсор следующей страницы,
+    дальше готовое тело ответа. JSON без отступов не содержит переводов строк.
+    """
+    return (cursor or "").encode() + b"\n" + body
+
+
+def page_response(cached: str | bytes, headers: dict | None = None) -> Response:
+    """
+    Отдает закэшированную страницу как есть, без разбора JSON и повторной
+    валидации по response_model.
+    """
+    if isinstance(cached, str):
+        cached = cached.encode()
+    cursor, _, body = cached.partition(b"\n")
+    headers = dict(headers or {})
+    if cursor:
+        headers["X-Next-Cursor"] = cursor.decode()
+    return Response(content=body, media_type="application/json", headers=headers)
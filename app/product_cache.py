@@ -0,0 +1,193 @@
+import os
+import json
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.cache import INVALIDATION_STOP_TIMEOUT, InvalidationListener, LRUCache
+from app.models import Product
+
+# Локальный уровень: короткий TTL страхует от пропущенных сообщений pub/sub
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", "30"))
+# Общий уровень в Redis
+PRODUCT_CACHE_REDIS_TTL = int(os.getenv("PRODUCT_CACHE_REDIS_TTL", "300"))
+PRODUCT_INVALIDATION_CHANNEL = "product_invalidations"
+
+
+@dataclass(frozen=True, slots=True)
+class CachedProduct:
+    """Строка товара, не привязанная к сессии БД"""
+
+    id: int
+    name: str
+    price: float
+
+
+def _product_key(product_id: int) -> str:
+    return f"product_row:{product_id}"
+
+
+def _version_key(product_id: int) -> str:
+    return f"product_version:{product_id}"
+
+
+# Строка из БД записывается, только если версия товара не изменилась с начала
+# загрузки: иначе invalidate() уже прошел и строка могла быть прочитана до commit.
+# KEYS: пары (строка, версия); ARGV: ttl, затем по тройке (версия, name, price).
+# Возвращает 1 или 0 для каждого товара: записан ли он.
+_STORE_IF_CURRENT_SCRIPT = """
+local ttl = ARGV[1]
+local stored = {}
+for i = 1, #KEYS, 2 do
+    local arg = (i - 1) / 2 * 3 + 2
+    if (redis.call('GET', KEYS[i + 1]) or '') == ARGV[arg] then
+        redis.call('HSET', KEYS[i], 'name', ARGV[arg + 1], 'price', ARGV[arg + 2])
+        redis.call('EXPIRE', KEYS[i], ttl)
+        stored[#stored + 1] = 1
+    else
+        stored[#stored + 1] = 0
+    end
+end
+return stored
+"""
+
+
+class ProductCache:
+    """
+    Двухуровневый кэш товаров по id: LRU процесса перед хэшами в Redis.
+
+    Изменение товара удаляет его из Redis и рассылает id через pub/sub,
+    чтобы остальные воркеры выбросили его из своих LRU.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = PRODUCT_CACHE_SIZE,
+        ttl: float = PRODUCT_CACHE_TTL,
+        redis_ttl: int = PRODUCT_CACHE_REDIS_TTL,
+    ):
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.redis_ttl = redis_ttl
+        # Растет при каждой инвалидации: загрузка, начатая до нее, не попадет в LRU
+        self._generation = 0
+        # Пока подписки нет, сообщения теряются: сбрасываем LRU целиком
+        self._listener = InvalidationListener(
+            PRODUCT_INVALIDATION_CHANNEL, self._drop_local, self.local.clear
+        )
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+    @property
+    def hit_ratio(self) -> float:
+        hits = self.stats["local_hits"] + self.stats["redis_hits"]
+        total = hits + self.stats["misses"]
+        return round(hits / total, 4) if total else 0.0
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "hit_ratio": self.hit_ratio, "local_size": len(self.local)}
+
+    async def get(
+        self, db: AsyncSession, redis: Redis, product_id: int
+    ) -> CachedProduct | None:
+        return (await self.get_many(db, redis, [product_id])).get(product_id)
+
+    async def get_many(
+        self, db: AsyncSession, redis: Redis, ids: Iterable[int]
+    ) -> dict[int, CachedProduct]:
+        """
+        Товары по id; несуществующих в результате нет. Промахи обоих уровней
+        загружаются одним запросом IN.
+        """
+        found: dict[int, CachedProduct] = {}
+        missing = []
+        for product_id in dict.fromkeys(ids):
+            product = self.local.get(product_id)
+            if product is not None:
+                found[product_id] = product
+            else:
+                missing.append(product_id)
+        self.stats["local_hits"] += len(found)
+        if not missing:
+            return found
+
+        # Версии читаются вместе со строками, до запроса в БД
+        async with redis.pipeline(transaction=False) as pipe:
+            for product_id in missing:
+                pipe.hgetall(_product_key(product_id))
+                pipe.get(_version_key(product_id))
+            replies = await pipe.execute()
+        rows, versions = replies[::2], replies[1::2]
+
+        not_in_redis = []
+        version_at_load: dict[int, str] = {}
+        for product_id, row, version in zip(missing, rows, versions):
+            if row:
+                product = CachedProduct(
+                    id=product_id, name=row["name"], price=float(row["price"])
+                )
+                found[product_id] = product
+                self.local.set(product_id, product)
+                self.stats["redis_hits"] += 1
+            else:
+                not_in_redis.append(product_id)
+                version_at_load[product_id] = version or ""
+        if not not_in_redis:
+            return found
+
+        self.stats["misses"] += len(not_in_redis)
+        generation = self._generation
+        result = await db.execute(
+            select(Product.id, Product.name, Product.price).where(
+                Product.id.in_(not_in_redis)
+            )
+        )
+        loaded = [CachedProduct(id=r.id, name=r.name, price=r.price) for r in result]
+        if not loaded:
+            return found
+
+        keys, args = [], [self.redis_ttl]
+        for product in loaded:
+            keys += [_product_key(product.id), _version_key(product.id)]
+            args += [version_at_load[product.id], product.name, product.price]
+        stored = await redis.eval(_STORE_IF_CURRENT_SCRIPT, len(keys), *keys, *args)
+        for product, is_current in zip(loaded, stored):
+            found[product.id] = product
+            # Товар изменили во время загрузки: строка отдается, но не кэшируется
+            if is_current and generation == self._generation:
+                self.local.set(product.id, product)
+        return found
+
+    async def invalidate(self, redis: Redis, *ids: int) -> None:
+        """Вызывается после commit изменения или удаления товаров"""
+        if not ids:
+            return
+        self._drop_local(ids)
+        # Новая версия не дает загрузкам, начатым до commit, вернуть старую строку
+        async with redis.pipeline(transaction=False) as pipe:
+            for product_id in ids:
+                pipe.incr(_version_key(product_id))
+                pipe.expire(_version_key(product_id), self.redis_ttl)
+            pipe.unlink(*(_product_key(product_id) for product_id in ids))
+            await pipe.execute()
+        await redis.publish(PRODUCT_INVALIDATION_CHANNEL, json.dumps(list(ids)))
+
+    def _drop_local(self, ids: Iterable[int]) -> None:
+        self._generation += 1
+        for product_id in ids:
+            self.local.pop(product_id)
+
+    def start(self, redis: Redis) -> None:
+        self._listener.start(redis)
+
+    async def stop(self, timeout: float = INVALIDATION_STOP_TIMEOUT) -> None:
+        await self._listener.stop(timeout)
+
+    def clear(self) -> None:
+        self.local.clear()
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+
+product_cache = ProductCache()
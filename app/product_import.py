@@ -0,0 +1,211 @@
+import os
+import csv
+import json
+import codecs
+from collections.abc import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Product
+from app.product_cache import product_cache
+from app.schemas.product import ProductImportRow
+
+# Сколько строк валидируется и пишется за один запрос к БД
+PRODUCT_IMPORT_CHUNK_SIZE = int(os.getenv("PRODUCT_IMPORT_CHUNK_SIZE", "1000"))
+# Сколько ошибок по строкам возвращается в ответе, остальные только считаются
+PRODUCT_IMPORT_MAX_ERRORS = int(os.getenv("PRODUCT_IMPORT_MAX_ERRORS", "100"))
+
+# Длиннее строка отвергается целиком: без перевода строки хвост иначе растет
+# вместе с телом запроса
+PRODUCT_IMPORT_MAX_LINE_LENGTH = int(
+    os.getenv("PRODUCT_IMPORT_MAX_LINE_LENGTH", str(64 * 1024))
+)
+
+CSV_CONTENT_TYPES = ("text/csv", "application/csv")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str | None]:
+    """
+    Режет поток байтов на строки, не держа в памяти больше одной строки.
+    Вместо строки длиннее PRODUCT_IMPORT_MAX_LINE_LENGTH символов отдает None.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    # Части незаконченной строки склеиваются один раз, когда строка закончится
+    pieces: list[str] = []
+    length = 0
+    too_long = False
+
+    async for chunk in chunks:
+        *lines, rest = decoder.decode(chunk).split("\n")
+        for line in lines:
+            if too_long or length + len(line) > PRODUCT_IMPORT_MAX_LINE_LENGTH:
+                yield None
+            else:
+                pieces.append(line)
+                yield "".join(pieces).rstrip("\r")
+            pieces, length, too_long = [], 0, False
+        length += len(rest)
+        if length > PRODUCT_IMPORT_MAX_LINE_LENGTH:
+            # Остаток строки дочитывается до перевода строки и отбрасывается
+            pieces, too_long = [], True
+        elif rest and not too_long:
+            pieces.append(rest)
+
+    rest = decoder.decode(b"", final=True)
+    if too_long or length + len(rest) > PRODUCT_IMPORT_MAX_LINE_LENGTH:
+        yield None
+    elif pieces or rest:
+        pieces.append(rest)
+        yield "".join(pieces).rstrip("\r")
+
+
+async def iter_records(
+    lines: AsyncIterator[str | None], fmt: str
+) -> AsyncIterator[tuple[int, dict | None, str | None]]:
+    """
+    Разбирает NDJSON или CSV (с заголовком) в (номер строки, запись, ошибка).
+    Многострочные значения в кавычках CSV не поддерживаются.
+    """
+    header = None
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if line is None:
+            yield line_no, None, "Line too long"
+            continue
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            if len(values) != len(header):
+                yield line_no, None, "Wrong number of columns"
+                continue
+            # Пустое значение в CSV означает отсутствие поля (например, id)
+            yield line_no, {k: v for k, v in zip(header, values) if v != ""}, None
+        else:
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "Expected a JSON object"
+                continue
+            yield line_no, record, None
+
+
+def _upsert(dialect_name: str):
+    module = postgresql if dialect_name == "postgresql" else sqlite
+    stmt = module.insert(Product)
+    return stmt.on_conflict_do_update(
+        index_elements=[Product.id],
+        set_={"name": stmt.excluded.name, "price": stmt.excluded.price},
+    )
+
+
+# setval только вперед: nextval сравнивается с наибольшим явным id пачки
+_ADVANCE_ID_SEQUENCE_SQL = text(
+    """
+    SELECT setval(pg_get_serial_sequence('products', 'id'), :max_id)
+    FROM (SELECT nextval(pg_get_serial_sequence('products', 'id')) AS next_id) AS seq
+    WHERE seq.next_id <= :max_id
+    """
+)
+
+
+class ProductImporter:
+    """
+    Пачками валидирует и записывает товары. Каждая пачка фиксируется
+    отдельно, поэтому память и длина транзакции не зависят от размера файла.
+    """
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        redis: Redis,
+        chunk_size: int = PRODUCT_IMPORT_CHUNK_SIZE,
+    ):
+        self.db = db
+        self.redis = redis
+        self.chunk_size = chunk_size
+        self.dialect_name = db.bind.dialect.name
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors: list[dict] = []
+
+    def reject(self, line: int, detail: str) -> None:
+        self.rejected += 1
+        if len(self.errors) < PRODUCT_IMPORT_MAX_ERRORS:
+            self.errors.append({"line": line, "detail": detail})
+
+    async def run(self, records: AsyncIterator[tuple[int, dict | None, str | None]]):
+        chunk: list[ProductImportRow] = []
+        async for line_no, record, error in records:
+            if error is not None:
+                self.reject(line_no, error)
+                continue
+            try:
+                chunk.append(ProductImportRow.model_validate(record))
+            except ValidationError as e:
+                self.reject(line_no, "; ".join(err["msg"] for err in e.errors()))
+                continue
+            if len(chunk) >= self.chunk_size:
+                await self.flush(chunk)
+                chunk = []
+        if chunk:
+            await self.flush(chunk)
+
+    async def flush(self, rows: list[ProductImportRow]) -> None:
+        new_rows = [row.model_dump(exclude={"id"}) for row in rows if row.id is None]
+        # Повтор id внутри пачки: побеждает последняя строка, как при построчной записи
+        upserts = {row.id: row.model_dump() for row in rows if row.id is not None}
+
+        # Строки с id пишутся первыми: строка без id не должна занять id,
+        # который дальше в пачке указан явно, и попасть в обновленные
+        existing: set[int] = set()
+        if upserts:
+            existing = set(
+                (
+                    await self.db.scalars(
+                        select(Product.id).where(Product.id.in_(upserts.keys()))
+                    )
+                ).all()
+            )
+            await self.db.execute(_upsert(self.dialect_name), list(upserts.values()))
+            self.updated += len(existing)
+            self.inserted += len(upserts) - len(existing)
+            await self._advance_id_sequence(max(upserts))
+
+        if new_rows:
+            await self.db.execute(insert(Product), new_rows)
+            self.inserted += len(new_rows)
+
+        await self.db.commit()
+        if existing:
+            await product_cache.invalidate(self.redis, *existing)
+
+    async def _advance_id_sequence(self, max_id: int) -> None:
+        """
+        Явные id не двигают sequence в PostgreSQL: без этого строки без id
+        и следующий create_product получат уже занятый id. Sequence только
+        растет, чтобы не выдать повторно id, взятые параллельными вставками.
+        """
+        if self.dialect_name != "postgresql":
+            return
+        await self.db.execute(_ADVANCE_ID_SEQUENCE_SQL, {"max_id": max_id})
+
+    def summary(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
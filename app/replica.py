@@ -0,0 +1,215 @@
+import os
+import math
+import asyncio
+import logging
+from collections.abc import AsyncGenerator
+
+from fastapi import Depends, HTTPException, Request
+from redis.asyncio import Redis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from app.cache import get_redis_client
+from app.database import engine_options, get_async_session, get_db_pool_stats
+from app.security import decode_access_token
+
+logger = logging.getLogger(__name__)
+
+# Реплика для тяжелых чтений; без нее все запросы идут в основную БД
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+# Сколько секунд после записи чтения пользователя идут в основную БД
+DB_READ_AFTER_WRITE_SECONDS = int(os.getenv("DB_READ_AFTER_WRITE_SECONDS", "5"))
+# При большем отставании реплики чтения переключаются на основную БД
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+# Прочитанное из реплики попадает в кэши с TTL дольше окна, поэтому окно
+# не может быть короче допустимого отставания: иначе старые строки вернутся в кэш
+READ_AFTER_WRITE_WINDOW = max(
+    DB_READ_AFTER_WRITE_SECONDS, math.ceil(DB_REPLICA_MAX_LAG_SECONDS)
+)
+# Окно после изменения каталога, общее для всех пользователей
+CATALOG_WRITE_SCOPE = "catalog"
+
+# На простаивающем primary pg_last_xact_replay_timestamp не двигается,
+# поэтому нулевая разница WAL считается нулевым отставанием
+_PG_REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+
+class ReplicaMonitor:
+    """
+    Периодически проверяет доступность и отставание реплики. Пока реплика
+    недоступна или отстает больше max_lag, чтения идут в основную БД.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine | None,
+        max_lag: float = DB_REPLICA_MAX_LAG_SECONDS,
+        interval: float = DB_REPLICA_CHECK_INTERVAL,
+    ):
+        self.engine = engine
+        self.session_factory = (
+            async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+            if engine is not None
+            else None
+        )
+        self.max_lag = max_lag
+        self.interval = interval
+        self.healthy = False
+        self.lag: float | None = None
+        self._task: asyncio.Task | None = None
+        self.stats = {"replica_reads": 0, "primary_reads": 0}
+
+    @property
+    def available(self) -> bool:
+        return (
+            self.session_factory is not None
+            and self.healthy
+            and self.lag is not None
+            and self.lag <= self.max_lag
+        )
+
+    async def check(self) -> None:
+        if self.engine is None:
+            return
+        try:
+            async with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    lag = await conn.scalar(text(_PG_REPLICA_LAG_SQL))
+                else:
+                    await conn.execute(text("SELECT 1"))
+                    lag = 0
+            self.lag = float(lag or 0)
+            self.healthy = True
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"Replica is unavailable, reading from primary: {e}")
+            self.healthy = False
+            self.lag = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.wait_for(self.check(), self.interval)
+            except asyncio.TimeoutError:
+                logger.warning("Replica health check timed out, reading from primary")
+                self.healthy = False
+                self.lag = None
+
+    async def start(self) -> None:
+        if self.engine is None or self._task is not None:
+            return
+        await self.check()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        if self.engine is not None:
+            await self.engine.dispose()
+
+    def snapshot(self) -> dict:
+        return {
+            "configured": self.engine is not None,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            **self.stats,
+            "pool": get_db_pool_stats(self.engine) if self.engine is not None else {},
+        }
+
+
+replica_monitor = ReplicaMonitor(
+    create_async_engine(DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL))
+    if DATABASE_REPLICA_URL
+    else None
+)
+
+
+def _recent_write_key(scope: str) -> str:
+    return f"recent_write:{scope}"
+
+
+async def mark_recent_write(redis: Redis, scope: str) -> None:
+    """
+    Следующие READ_AFTER_WRITE_WINDOW секунд чтения в этой области (email
+    пользователя или CATALOG_WRITE_SCOPE) идут в основную БД.
+    """
+    if replica_monitor.engine is not None:
+        await redis.set(_recent_write_key(scope), 1, ex=READ_AFTER_WRITE_WINDOW)
+
+
+async def mark_catalog_write(redis: Redis = Depends(get_redis_client)) -> None:
+    """Зависимость обработчиков, которые меняют товары; срабатывает до commit"""
+    await mark_recent_write(redis, CATALOG_WRITE_SCOPE)
+
+
+def _token_email(request: Request) -> str | None:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_access_token(token).email
+    except HTTPException:
+        return None
+
+
+async def _route_read(
+    request: Request, primary: AsyncSession, redis: Redis, *scopes: str
+) -> AsyncGenerator[AsyncSession, None]:
+    monitor = replica_monitor
+    use_replica = monitor.available
+    if use_replica:
+        email = _token_email(request)
+        if email is not None:
+            scopes = (*scopes, email)
+        if scopes and await redis.exists(*map(_recent_write_key, scopes)):
+            use_replica = False
+
+    if not use_replica:
+        monitor.stats["primary_reads"] += 1
+        yield primary
+        return
+
+    monitor.stats["replica_reads"] += 1
+    async with monitor.session_factory() as session:
+        yield session
+
+
+async def get_read_session(
+    request: Request,
+    primary: AsyncSession = Depends(get_async_session),
+    redis: Redis = Depends(get_redis_client),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия для обработчиков, которые только читают. Уходит в реплику, если
+    она здорова и пользователь недавно ничего не менял.
+    """
+    async for session in _route_read(request, primary, redis):
+        yield session
+
+
+async def get_catalog_read_session(
+    request: Request,
+    primary: AsyncSession = Depends(get_async_session),
+    redis: Redis = Depends(get_redis_client),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    То же для чтений, которые заполняют общие кэши товаров: после любого
+    изменения каталога они идут в основную БД, пока реплика могла отставать.
+    """
+    async for session in _route_read(request, primary, redis, CATALOG_WRITE_SCOPE):
+        yield session
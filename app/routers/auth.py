@@ -1,14 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select
 from app.database import get_async_session
 from app.schemas.user import UserCreate, UserResponse, UserInDB
 from app.schemas.token import Token
-from app.security import create_access_token, hash_password, verify_password
+from app.security import (
+    create_access_token,
+    hash_password_async,
+    verify_password_async,
+)
 from app.models import User
 from datetime import timedelta
-from app.broker import send_message
+from app.outbox import add_event, outbox_relay
 
 router = APIRouter()
 
@@ -29,14 +33,17 @@ async def register_user(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
 
-    hashed_password = hash_password(user_data.password)
-    new_user = User(email=user_data.email, hashed_password=hashed_password)
-    db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
+    hashed_password = await hash_password_async(user_data.password)
+    # id и значения по умолчанию приходят из RETURNING, без refresh после commit
+    new_user = await db.scalar(
+        insert(User)
+        .values(email=user_data.email, hashed_password=hashed_password)
+        .returning(User)
+    )
 
-    # RabbitMQ: Отправка события
-    await send_message(
+    # RabbitMQ: событие пишется в outbox в той же транзакции, отправит его relay
+    add_event(
+        db,
         event_type="user_registered",
         data={
             "id": new_user.id,
@@ -44,6 +51,8 @@ async def register_user(
             "is_active": new_user.is_active,
         },
     )
+    await db.commit()
+    outbox_relay.notify()
 
     return new_user
 
@@ -56,7 +65,7 @@ async def login_for_access_token(
     user_result = await db.execute(select(User).where(User.email == form_data.username))
     user_in_db = user_result.scalars().first()
 
-    if not user_in_db or not verify_password(
+    if not user_in_db or not await verify_password_async(
         form_data.password, user_in_db.hashed_password
     ):
         raise HTTPException(
@@ -1,56 +1,113 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, delete, update, insert
 from sqlalchemy.orm import selectinload
 from app.database import get_async_session
-from app.schemas.order import OrderCreate, OrderStatus, OrderResponse
-from app.models import Order, Product, User
-from app.dependencies import get_current_active_user
-from app.cache import get_redis_client
+from app.replica import get_read_session
+from app.schemas.order import (
+    OrderBatchCreate,
+    OrderCreate,
+    OrderLineError,
+    OrderStatus,
+    OrderResponse,
+    OrderSummary,
+)
+from app.models import Order, UserOrderStats
+from app.dependencies import Principal, get_current_active_user
+from app.export import ExportFormat, export_response
+from app.pagination import decode_cursor, next_cursor, pack_page, page_response
+from app.cache import (
+    get_change_counter,
+    get_or_set,
+    get_redis_client,
+    invalidate_user_orders,
+    orders_cache_key,
+    orders_cache_tags,
+    orders_changes,
+)
+from app.conditional import (
+    PRIVATE_CACHE_CONTROL,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+from pydantic import TypeAdapter
 from redis.asyncio import Redis
-import json
 from typing import Any, Literal
 from datetime import datetime
-from app.broker import send_message
+from app.order_stats import (
+    change_status,
+    record_order_deleted,
+    record_orders_created,
+    record_status_changed,
+    to_money,
+)
+from app.outbox import add_event, outbox_relay
+from app.product_cache import product_cache
 
 
 router = APIRouter()
 
 CACHE_TTL = 60
 
+orders_adapter = TypeAdapter(list[OrderResponse])
+
 
 @router.get("/orders", response_model=list[OrderResponse])
 async def read_orders(
+    request: Request,
     status: Literal["pending", "completed", "cancelled"] | None = Query(
         None, description="Filter orders by status"
     ),
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_active_user),
+    cursor: str | None = Query(
+        None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"
+    ),
+    db: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_active_user),
     redis: Redis = Depends(get_redis_client),
 ):
-    cache_key = f"orders:{current_user.id}:{status}:{skip}:{limit}"
-    cached_orders = await redis.get(cache_key)
-
-    if cached_orders:
-        return json.loads(cached_orders)
-
-    query = select(Order).where(Order.user_id == current_user.id)
-
+    scope = orders_changes(current_user.id)
+    etag = make_etag("orders", await get_change_counter(redis, scope))
+    if etag_matches(request, etag):
+        return not_modified(etag, PRIVATE_CACHE_CONTROL)
+
+    # Сначала новые заказы; id растет вместе со временем создания
+    query = (
+        select(Order)
+        .where(Order.user_id == current_user.id)
+        .order_by(Order.id.desc())
+        .limit(limit)
+    )
     if status:
         query = query.where(Order.status == status)
 
-    query = query.offset(skip).limit(limit)
+    after_id = decode_cursor(cursor)["id"] if cursor else None
+    if after_id is not None:
+        query = query.where(Order.id < after_id)
+    else:
+        query = query.offset(skip)
+
+    cache_key = await orders_cache_key(
+        redis, current_user.id, status, skip, limit, after_id=after_id
+    )
 
-    result = await db.execute(query)
-    orders = result.scalars().all()
+    async def load_orders():
+        result = await db.execute(query)
+        orders = result.scalars().all()
 
-    order_responses = [OrderResponse.from_orm(o) for o in orders]
-    orders_for_cache = [o.model_dump(mode="json") for o in order_responses]
-    await redis.set(cache_key, json.dumps(orders_for_cache), ex=CACHE_TTL)
+        body = orders_adapter.dump_json(
+            orders_adapter.validate_python(orders, from_attributes=True)
+        )
+        page = pack_page(body, next_cursor(orders, limit))
+        return page, orders_cache_tags(current_user.id)
 
-    return order_responses
+    cached_page = await get_or_set(redis, cache_key, load_orders, CACHE_TTL)
+    return page_response(
+        cached_page, {"ETag": etag, "Cache-Control": PRIVATE_CACHE_CONTROL}
+    )
 
 
 @router.post(
@@ -59,57 +116,180 @@ async def read_orders(
 async def create_order(
     order: OrderCreate,
     db: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     redis: Redis = Depends(get_redis_client),
 ):
-    product_result = await db.execute(
-        select(Product).where(Product.id == order.product_id)
-    )
-    product = product_result.scalars().first()
+    # Популярные товары читаются из кэша, а не из БД на каждый заказ
+    product = await product_cache.get(db, redis, order.product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
 
-    db_order = Order(
-        user_id=current_user.id,
-        product_id=order.product_id,
-        quantity=order.quantity,
-        status="pending",
+    # Один INSERT ... RETURNING вместо flush и refresh после commit:
+    # серверные значения (id, created_at) приходят сразу
+    unit_price = to_money(product.price)
+    db_order = await db.scalar(
+        insert(Order)
+        .values(
+            user_id=current_user.id,
+            product_id=order.product_id,
+            quantity=order.quantity,
+            unit_price=unit_price,
+            total=unit_price * order.quantity,
+            status="pending",
+        )
+        .returning(Order)
     )
-    db.add(db_order)
-    await db.commit()
-    await db.refresh(db_order)
+    await record_orders_created(db, current_user.id, [db_order])
 
-    keys = await redis.keys(f"orders:{current_user.id}:*")
-    if keys:
-        await redis.delete(*keys)
-
-    # RabbitMQ: Отправка события
+    # RabbitMQ: событие пишется в outbox в той же транзакции, отправит его relay
     # Приводим статус к строке, если это Enum, чтобы избежать ошибок JSON
     status_value = (
         db_order.status.value if hasattr(db_order.status, "value") else db_order.status
     )
 
-    await send_message(
+    add_event(
+        db,
         event_type="order_created",
         data={
             "id": db_order.id,
             "user_id": db_order.user_id,
             "product_id": db_order.product_id,
             "quantity": db_order.quantity,
+            "unit_price": str(db_order.unit_price),
+            "total": str(db_order.total),
             "status": status_value,
         },
     )
+    await db.commit()
+    outbox_relay.notify()
+
+    await invalidate_user_orders(redis, current_user.id)
 
     return db_order
 
 
+@router.post(
+    "/orders/batch",
+    response_model=list[OrderResponse],
+    status_code=status.HTTP_201_CREATED,
+    responses={422: {"description": "Строки с ошибками, ни один заказ не создан"}},
+)
+async def create_orders_batch(
+    batch: OrderBatchCreate,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: Principal = Depends(get_current_active_user),
+    redis: Redis = Depends(get_redis_client),
+):
+    """
+    Создает несколько заказов за одну транзакцию: либо все, либо ни одного.
+    """
+    product_ids = {item.product_id for item in batch.items}
+    existing = await product_cache.get_many(db, redis, product_ids)
+
+    errors = [
+        OrderLineError(index=i, product_id=item.product_id, detail="Product not found")
+        for i, item in enumerate(batch.items)
+        if item.product_id not in existing
+    ]
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail=[error.model_dump() for error in errors],
+        )
+
+    # Один многострочный INSERT ... RETURNING вместо insert + refresh на каждый заказ
+    result = await db.scalars(
+        insert(Order).returning(Order, sort_by_parameter_order=True),
+        [
+            {
+                "user_id": current_user.id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "unit_price": to_money(existing[item.product_id].price),
+                "total": to_money(existing[item.product_id].price) * item.quantity,
+                "status": "pending",
+            }
+            for item in batch.items
+        ],
+    )
+    db_orders = result.all()
+    await record_orders_created(db, current_user.id, db_orders)
+
+    add_event(
+        db,
+        event_type="orders_created",
+        data={
+            "user_id": current_user.id,
+            "orders": [
+                {
+                    "id": o.id,
+                    "product_id": o.product_id,
+                    "quantity": o.quantity,
+                    "unit_price": str(o.unit_price),
+                    "total": str(o.total),
+                    "status": o.status.value,
+                }
+                for o in db_orders
+            ],
+        },
+    )
+    await db.commit()
+    outbox_relay.notify()
+
+    await invalidate_user_orders(redis, current_user.id)
+
+    return db_orders
+
+
+@router.get("/orders/export", response_class=StreamingResponse)
+async def export_orders(
+    status: Literal["pending", "completed", "cancelled"] | None = Query(
+        None, description="Filter orders by status"
+    ),
+    format: ExportFormat = "ndjson",
+    db: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """
+    Вся история заказов пользователя потоком, от старых к новым.
+    """
+    query = (
+        select(
+            Order.id,
+            Order.product_id,
+            Order.quantity,
+            Order.status,
+            Order.created_at,
+            Order.updated_at,
+        )
+        .where(Order.user_id == current_user.id)
+        .order_by(Order.id)
+    )
+    if status:
+        query = query.where(Order.status == status)
+    return export_response(db, query, format, "orders")
+
+
+@router.get("/orders/summary", response_model=OrderSummary)
+async def read_orders_summary(
+    db: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """
+    Число заказов, сумма неотмененных и время последнего заказа. Читается
+    одна строка сводки, которую поддерживают обработчики записи.
+    """
+    stats = await db.get(UserOrderStats, current_user.id)
+    return stats if stats is not None else OrderSummary()
+
+
 @router.get("/orders/{order_id}", response_model=OrderResponse)
 async def read_order(
     order_id: int,
-    db: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_read_session),
+    current_user: Principal = Depends(get_current_active_user),
 ):
     result = await db.execute(
         select(Order).where(Order.id == order_id, Order.user_id == current_user.id)
@@ -128,29 +308,23 @@ async def update_order_status(
     order_id: int,
     order_status: OrderStatus,
     db: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     redis: Redis = Depends(get_redis_client),
 ):
-    stmt = (
-        update(Order)
-        .where(Order.id == order_id, Order.user_id == current_user.id)
-        .values(status=order_status.status)
-    )
-    result = await db.execute(stmt)
-
-    if result.rowcount == 0:
+    changed = await change_status(db, order_id, current_user.id, order_status.status)
+    if changed is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found or you don't have permission to update it",
         )
+    updated_order, old_status = changed
+    await record_status_changed(
+        db, current_user.id, old_status, updated_order.status, updated_order.total
+    )
 
     await db.commit()
 
-    keys = await redis.keys(f"orders:{current_user.id}:*")
-    if keys:
-        await redis.delete(*keys)
-
-    updated_order = await db.get(Order, order_id)
+    await invalidate_user_orders(redis, current_user.id)
 
     return updated_order
 
@@ -159,24 +333,25 @@ async def update_order_status(
 async def delete_order(
     order_id: int,
     db: AsyncSession = Depends(get_async_session),
-    current_user: User = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
     redis: Redis = Depends(get_redis_client),
 ):
-    result = await db.execute(
-        select(Order).where(Order.id == order_id, Order.user_id == current_user.id)
-    )
-    order = result.scalars().first()
-    if order is None:
+    deleted = (
+        await db.execute(
+            delete(Order)
+            .where(Order.id == order_id, Order.user_id == current_user.id)
+            .returning(Order.status, Order.total)
+        )
+    ).first()
+    if deleted is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found or you don't have permission to delete it",
         )
+    await record_order_deleted(db, current_user.id, deleted.status, deleted.total)
 
-    await db.delete(order)
     await db.commit()
 
-    keys = await redis.keys(f"orders:{current_user.id}:*")
-    if keys:
-        await redis.delete(*keys)
+    await invalidate_user_orders(redis, current_user.id)
 
     return {"message": "Order deleted successfully"}
@@ -1,70 +1,300 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import math
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, delete, insert, tuple_, update
 from app.database import get_async_session
-from app.schemas.product import ProductCreate, ProductUpdate, ProductResponse
+from app.replica import (
+    get_catalog_read_session,
+    get_read_session,
+    mark_catalog_write,
+)
+from app.schemas.product import (
+    ProductCreate,
+    ProductImportSummary,
+    ProductUpdate,
+    ProductResponse,
+)
 from app.models import Product
-from app.dependencies import get_current_active_user
-from app.cache import get_redis_client
+from app.dependencies import Principal, get_current_active_user
+from app.export import ExportFormat, export_response
+from app.pagination import decode_cursor, next_cursor, pack_page, page_response
+from app.product_cache import product_cache
+from app.search import find_products, normalize_query
+from app.product_import import (
+    CSV_CONTENT_TYPES,
+    ProductImporter,
+    iter_lines,
+    iter_records,
+)
+from app.cache import (
+    PRODUCT_SEARCH_TAG,
+    PRODUCTS_CHANGES,
+    PRODUCTS_SORTED_TAG,
+    PRODUCTS_TAG,
+    get_change_counter,
+    get_or_set,
+    get_redis_client,
+    invalidate_products,
+    product_tag,
+)
+from app.conditional import (
+    PUBLIC_CACHE_CONTROL,
+    etag_matches,
+    make_etag,
+    not_modified,
+)
+from pydantic import TypeAdapter
 from redis.asyncio import Redis
-import json
-from typing import Any, Union
+from typing import Literal
 
 
 router = APIRouter()
 
 CACHE_TTL = 60  # Cache time-to-live in seconds
+SEARCH_CACHE_TTL = 300  # Сбрасывается любой записью товаров
+PRODUCTS_PAGE_MAX_LIMIT = 100
+# Глубже страницы по skip не кэшируются: их мало кто читает, а число ключей
+# иначе ничем не ограничено. Курсоры подписаны, их позиции - реальные строки
+PRODUCTS_CACHE_MAX_SKIP = 1000
+
+products_adapter = TypeAdapter(list[ProductResponse])
+
+
+ProductSort = Literal["id", "price", "-price", "name"]
+
+
+def valid_cursor_value(key: str, value: object) -> bool:
+    """Значение курсора подходит к столбцу сортировки"""
+    if isinstance(value, bool):
+        return False
+    if key == "name":
+        return isinstance(value, str)
+    if key == "price":
+        return isinstance(value, (int, float)) and math.isfinite(value)
+    return isinstance(value, int)
+
+
+def products_cache_key(
+    sort: ProductSort,
+    min_price: float | None,
+    max_price: float | None,
+    skip: int,
+    limit: int,
+    position: dict | None,
+) -> str:
+    """
+    Ключ страницы списка товаров. Для списка без фильтров и сортировки
+    остается прежняя схема products:{skip}:{limit} и products:after:{id}:{limit}.
+    В ключ попадают только поля курсора, по которым строится запрос.
+    """
+    if sort == "id" and min_price is None and max_price is None:
+        page = f"after:{position['id']}" if position else skip
+        return f"products:{page}:{limit}"
+    if position:
+        page = f"after:{position[sort.lstrip('-')]}:{position['id']}"
+    else:
+        page = skip
+    bounds = ":".join(
+        "-" if price is None else f"{price:.2f}" for price in (min_price, max_price)
+    )
+    return f"products:{sort}:{bounds}:{page}:{limit}"
+
+
+def to_cents(price: float | None) -> float | None:
+    return None if price is None else round(price, 2)
 
 
 @router.get("/products", response_model=list[ProductResponse])
 async def read_products(
-    skip: int = 0,
-    limit: int = 100,
-    db: AsyncSession = Depends(get_async_session),
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(
+        100, ge=1, description=f"Не больше {PRODUCTS_PAGE_MAX_LIMIT}, больший урезается"
+    ),
+    cursor: str | None = Query(
+        None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"
+    ),
+    min_price: float | None = Query(None, ge=0),
+    max_price: float | None = Query(None, ge=0),
+    sort: ProductSort = Query("id", description="Поле сортировки, '-' - по убыванию"),
+    db: AsyncSession = Depends(get_catalog_read_session),
     redis: Redis = Depends(get_redis_client),
 ):
-    cache_key = f"products:{skip}:{limit}"
-    cached_products = await redis.get(cache_key)
+    # Клиент с актуальной версией каталога получает 304 без БД и без тела
+    etag = make_etag("products", await get_change_counter(redis, PRODUCTS_CHANGES))
+    if etag_matches(request, etag):
+        return not_modified(etag, PUBLIC_CACHE_CONTROL)
 
-    if cached_products:
-        return json.loads(cached_products)
+    # Старые клиенты просят страницы больше максимума: отдаем максимум, а не 422
+    limit = min(limit, PRODUCTS_PAGE_MAX_LIMIT)
+    # Границы цены - до копеек: одинаковые по смыслу фильтры делят ключ кэша
+    min_price, max_price = to_cents(min_price), to_cents(max_price)
 
-    result = await db.execute(select(Product).offset(skip).limit(limit))
-    products = result.scalars().all()
+    # Стабильный порядок: id добавляется как второй ключ сортировки, индексы
+    # (price, id) и (name, id) отдают страницу без сортировки всей выборки
+    key_name = sort.lstrip("-")
+    descending = sort.startswith("-")
+    keyset = [Product.id] if key_name == "id" else [getattr(Product, key_name), Product.id]
+    query = (
+        select(Product)
+        .order_by(*(column.desc() if descending else column for column in keyset))
+        .limit(limit)
+    )
+    if min_price is not None:
+        query = query.where(Product.price >= min_price)
+    if max_price is not None:
+        query = query.where(Product.price <= max_price)
 
-    # Convert SQLAlchemy models to Pydantic models for response and caching
-    product_responses = [ProductResponse.from_orm(p) for p in products]
+    position = None
+    if cursor:
+        position = decode_cursor(cursor)
+        # Курсор от страницы с другой сортировкой не содержит нужного ключа,
+        # а значение не того типа база отвергнет уже при выполнении запроса
+        if not valid_cursor_value(key_name, position.get(key_name)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+        row = tuple_(*keyset)
+        bound = tuple_(*(position[column.key] for column in keyset))
+        query = query.where(row < bound if descending else row > bound)
+    else:
+        query = query.offset(skip)
 
-    # Convert Pydantic models to a list of dicts for JSON serialization
-    products_for_cache = [p.model_dump() for p in product_responses]
-    await redis.set(cache_key, json.dumps(products_for_cache), ex=CACHE_TTL)
+    cursor_keys = () if key_name == "id" else (key_name,)
 
-    return product_responses
+    async def load_products():
+        result = await db.execute(query)
+        products = result.scalars().all()
+
+        # Сериализуем один раз: в кэш попадают ровно те байты, что уходят клиенту
+        body = products_adapter.dump_json(
+            products_adapter.validate_python(products, from_attributes=True)
+        )
+        if cursor_keys or min_price is not None or max_price is not None:
+            tags = [PRODUCTS_TAG, PRODUCTS_SORTED_TAG]
+        else:
+            tags = [PRODUCTS_TAG, *(product_tag(p.id) for p in products)]
+        return pack_page(body, next_cursor(products, limit, *cursor_keys)), tags
+
+    if not cursor and skip >= PRODUCTS_CACHE_MAX_SKIP:
+        cached_page, _ = await load_products()
+    else:
+        # Одновременные промахи по ключу выполняют запрос в БД один раз
+        cache_key = products_cache_key(sort, min_price, max_price, skip, limit, position)
+        cached_page = await get_or_set(redis, cache_key, load_products, CACHE_TTL)
+    return page_response(
+        cached_page, {"ETag": etag, "Cache-Control": PUBLIC_CACHE_CONTROL}
+    )
 
 
 @router.post(
-    "/products", response_model=ProductResponse, status_code=status.HTTP_201_CREATED
+    "/products",
+    response_model=ProductResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(mark_catalog_write)],
 )
 async def create_product(
     product: ProductCreate,
     db: AsyncSession = Depends(get_async_session),
     redis: Redis = Depends(get_redis_client),
-    current_user: Any = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    db_product = Product(**product.model_dump())
-    db.add(db_product)
+    db_product = await db.scalar(
+        insert(Product).values(**product.model_dump()).returning(Product)
+    )
     await db.commit()
-    await db.refresh(db_product)
 
-    # Invalidate cache
-    await redis.delete(f"products:0:100") # A simple invalidation strategy
+    # Новый товар может попасть на любую страницу
+    await invalidate_products(redis, PRODUCTS_TAG)
     return db_product
 
 
+@router.post(
+    "/products/bulk",
+    response_model=ProductImportSummary,
+    dependencies=[Depends(mark_catalog_write)],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {"schema": {"type": "string"}},
+                "text/csv": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_products(
+    request: Request,
+    db: AsyncSession = Depends(get_async_session),
+    redis: Redis = Depends(get_redis_client),
+    current_user: Principal = Depends(get_current_active_user),
+):
+    """
+    Потоковый импорт товаров из NDJSON или CSV (с заголовком name,price[,id]).
+    Строки с id обновляют существующие товары, остальные создаются.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    fmt = "csv" if content_type in CSV_CONTENT_TYPES else "ndjson"
+
+    importer = ProductImporter(db, redis)
+    try:
+        await importer.run(iter_records(iter_lines(request.stream()), fmt))
+    finally:
+        # Уже зафиксированные пачки видны даже при обрыве загрузки
+        if importer.inserted or importer.updated:
+            await invalidate_products(redis, PRODUCTS_TAG)
+    return importer.summary()
+
+
+@router.get("/products/export", response_class=StreamingResponse)
+async def export_products(
+    format: ExportFormat = "ndjson",
+    db: AsyncSession = Depends(get_read_session),
+):
+    """
+    Выгрузка всего каталога потоком, без кэша и без пагинации.
+    """
+    query = select(Product.id, Product.name, Product.price).order_by(Product.id)
+    return export_response(db, query, format, "products")
+
+
+@router.get("/products/search", response_model=list[ProductResponse])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_catalog_read_session),
+    redis: Redis = Depends(get_redis_client),
+):
+    """
+    Поиск товаров по словам названия; слова запроса от двух символов
+    ищутся как префиксы.
+    """
+    query = normalize_query(q)
+    if not query:
+        return []
+
+    async def load_results():
+        version = await get_change_counter(redis, PRODUCTS_CHANGES)
+        products = await find_products(db, query, limit, version)
+        body = products_adapter.dump_json(
+            products_adapter.validate_python(products, from_attributes=True)
+        )
+        return pack_page(body, None), [PRODUCT_SEARCH_TAG]
+
+    cache_key = f"product_search:{limit}:{query}"
+    cached_page = await get_or_set(redis, cache_key, load_results, SEARCH_CACHE_TTL)
+    return page_response(cached_page)
+
+
 @router.get("/products/{product_id}", response_model=ProductResponse)
-async def read_product(product_id: int, db: AsyncSession = Depends(get_async_session)):
-    result = await db.execute(select(Product).where(Product.id == product_id))
-    product = result.scalars().first()
+async def read_product(
+    product_id: int,
+    db: AsyncSession = Depends(get_catalog_read_session),
+    redis: Redis = Depends(get_redis_client),
+):
+    product = await product_cache.get(db, redis, product_id)
     if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
@@ -72,52 +302,65 @@ async def read_product(product_id: int, db: AsyncSession = Depends(get_async_ses
     return product
 
 
-@router.put("/products/{product_id}", response_model=ProductResponse)
+@router.put(
+    "/products/{product_id}",
+    response_model=ProductResponse,
+    dependencies=[Depends(mark_catalog_write)],
+)
 async def update_product(
     product_id: int,
     product_update: ProductUpdate,
     db: AsyncSession = Depends(get_async_session),
     redis: Redis = Depends(get_redis_client),
-    current_user: Any = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    result = await db.execute(select(Product).where(Product.id == product_id))
-    product = result.scalars().first()
+    update_data = product_update.model_dump(exclude_unset=True)
+    if not update_data:
+        # Менять нечего (UPDATE без SET невозможен): отдаем товар как есть
+        return await read_product(product_id, db, redis)
+
+    product = await db.scalar(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(**update_data)
+        .returning(Product)
+    )
     if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
 
-    update_data = product_update.model_dump(
-        exclude_unset=True
-    )
-    for key, value in update_data.items():
-        setattr(product, key, value)
-
     await db.commit()
-    await db.refresh(product)
-    
-    # Invalidate cache
-    await redis.delete(f"products:0:100")
+
+    # Состав страниц по id не меняется: сбрасываем только страницы с этим
+    # товаром и страницы с другой сортировкой
+    await invalidate_products(redis, product_tag(product_id), PRODUCTS_SORTED_TAG)
+    await product_cache.invalidate(redis, product_id)
     return product
 
 
-@router.delete("/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/products/{product_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(mark_catalog_write)],
+)
 async def delete_product(
     product_id: int,
     db: AsyncSession = Depends(get_async_session),
     redis: Redis = Depends(get_redis_client),
-    current_user: Any = Depends(get_current_active_user),
+    current_user: Principal = Depends(get_current_active_user),
 ):
-    result = await db.execute(select(Product).where(Product.id == product_id))
-    product = result.scalars().first()
-    if product is None:
+    deleted_id = await db.scalar(
+        delete(Product).where(Product.id == product_id).returning(Product.id)
+    )
+    if deleted_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
         )
 
-    await db.delete(product)
     await db.commit()
-    
-    # Invalidate cache
-    await redis.delete(f"products:0:100")
+
+    # Удаление сдвигает все последующие страницы
+    await invalidate_products(redis, PRODUCTS_TAG)
+    await product_cache.invalidate(redis, product_id)
     return {"message": "Product deleted successfully"}
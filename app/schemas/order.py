@@ -1,4 +1,5 @@
 from datetime import datetime
+from decimal import Decimal
 from pydantic import BaseModel, Field
 from typing import Literal, Optional
 from app.models import OrderStatus as OrderStatusEnum
@@ -12,6 +13,16 @@ class OrderCreate(OrderBase):
     pass
 
 
+class OrderBatchCreate(BaseModel):
+    items: list[OrderCreate] = Field(..., min_length=1, max_length=100)
+
+
+class OrderLineError(BaseModel):
+    index: int
+    product_id: int
+    detail: str
+
+
 class OrderStatus(BaseModel):
     status: Literal["pending", "completed", "cancelled"]
 
@@ -19,9 +30,21 @@ class OrderStatus(BaseModel):
 class OrderResponse(OrderBase):
     id: int
     user_id: int
+    # Decimal в JSON - строка, без ошибок округления float
+    unit_price: Decimal
+    total: Decimal
     status: OrderStatusEnum = "pending"
     created_at: datetime
     updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+
+class OrderSummary(BaseModel):
+    order_count: int = 0
+    total_spent: Decimal = Decimal(0)
+    last_order_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
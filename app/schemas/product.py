@@ -10,6 +10,23 @@ class ProductCreate(ProductBase):
     pass
 
 
+class ProductImportRow(ProductCreate):
+    # Строка с id обновляет существующий товар или создает товар с этим id
+    id: int | None = Field(None, gt=0)
+
+
+class ProductImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class ProductImportSummary(BaseModel):
+    inserted: int
+    updated: int
+    rejected: int
+    errors: list[ProductImportError]
+
+
 class ProductUpdate(BaseModel):
     name: str | None = Field(None, min_length=3, max_length=100)
     price: float | None = Field(None, gt=0)
@@ -0,0 +1,156 @@
+import os
+import re
+import asyncio
+import bisect
+import heapq
+from collections import defaultdict
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Product
+
+SEARCH_MAX_TERMS = int(os.getenv("SEARCH_MAX_TERMS", "8"))
+# Более короткие термы ищутся только как слово целиком: префикс из одной
+# буквы совпадает с заметной частью каталога
+SEARCH_MIN_PREFIX = int(os.getenv("SEARCH_MIN_PREFIX", "2"))
+# Размер пачки при построении локального индекса
+SEARCH_INDEX_FETCH_SIZE = int(os.getenv("SEARCH_INDEX_FETCH_SIZE", "10000"))
+
+# Generated-столбец to_tsvector('simple', name) с GIN-индексом, есть только
+# в PostgreSQL (миграция e8d05b3a7c41), поэтому в модели его нет
+SEARCH_VECTOR = literal_column("products.search_vector")
+
+# Буквы и цифры без "_": парсер PostgreSQL считает подчеркивание разделителем
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Слова из букв и цифр, как части слов у парсера to_tsvector('simple'):
+    "Wi-Fi" -> wi, fi; "O'Reilly" -> o, reilly; "USB_C" -> usb, c; "PS5" -> ps5.
+    Составные лексемы PostgreSQL (wi-fi целиком, дроби вроде 1.5, email, URL)
+    сюда не попадают: запрос всегда режется на части, и оба варианта поиска
+    совпадают только по ним. Поиск по дробям и адресам не поддерживается.
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+
+def normalize_query(q: str) -> str:
+    """
+    Ключ запроса для кэша: "  Laptop  PRO!" и "laptop pro" дают одно и то же.
+    Повторы убираются, лишние слова отбрасываются.
+    """
+    return " ".join(list(dict.fromkeys(tokenize(q)))[:SEARCH_MAX_TERMS])
+
+
+class ProductSearchIndex:
+    """
+    Локальный индекс для SQLite (тесты, бенчмарки): инвертированный индекс
+    слово -> id товаров и отсортированный словарь, в котором слова
+    с префиксом находятся бинарным поиском.
+
+    Индекс строится целиком при первом поиске и перестраивается, когда
+    меняется счетчик изменений каталога (его увеличивает каждая запись товаров).
+    """
+
+    def __init__(self):
+        self.version: int | None = None
+        self.postings: dict[str, set[int]] = {}
+        self.vocabulary: list[str] = []
+        self._lock = asyncio.Lock()
+
+    def clear(self) -> None:
+        self.version = None
+        self.postings = {}
+        self.vocabulary = []
+
+    async def ensure(self, db: AsyncSession, version: int) -> None:
+        if self.version == version:
+            return
+        async with self._lock:
+            if self.version == version:
+                return
+            postings = defaultdict(set)
+            result = await db.stream(
+                select(Product.id, Product.name).execution_options(
+                    yield_per=SEARCH_INDEX_FETCH_SIZE
+                )
+            )
+            async for product_id, name in result:
+                for token in tokenize(name):
+                    postings[token].add(product_id)
+            self.postings = dict(postings)
+            self.vocabulary = sorted(self.postings)
+            self.version = version
+
+    def _prefix_matches(self, prefix: str) -> tuple[set[int], set[int]]:
+        """(товары со словом prefix целиком, товары со словом на prefix)"""
+        exact = self.postings.get(prefix, set())
+        if len(prefix) < SEARCH_MIN_PREFIX:
+            return exact, exact
+        matched = set()
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            matched |= self.postings[token]
+        return exact, matched
+
+    def search(self, query: str, limit: int) -> list[int]:
+        """
+        id товаров, в названии которых есть слово на каждый терм запроса.
+        Выше те, где термы совпали со словами целиком.
+        """
+        exact_sets = []
+        candidates: set[int] | None = None
+        for term in query.split():
+            exact, matched = self._prefix_matches(term)
+            candidates = matched if candidates is None else candidates & matched
+            if not candidates:
+                return []
+            exact_sets.append(exact)
+
+        # Нужны только первые limit: куча вместо сортировки всех кандидатов
+        return heapq.nsmallest(
+            limit,
+            candidates,
+            key=lambda pid: (-sum(pid in exact for exact in exact_sets), pid),
+        )
+
+
+search_index = ProductSearchIndex()
+
+
+async def find_products(
+    db: AsyncSession, query: str, limit: int, version: int
+) -> list[Product]:
+    """
+    Поиск по нормализованному запросу: в PostgreSQL по tsvector (термы от
+    SEARCH_MIN_PREFIX символов - префиксы), иначе по локальному индексу.
+    """
+    if db.bind.dialect.name == "postgresql":
+        # Термы состоят только из букв и цифр, поэтому операторы tsquery в них не попадут
+        tsquery = func.to_tsquery(
+            "simple",
+            " & ".join(
+                f"{term}:*" if len(term) >= SEARCH_MIN_PREFIX else term
+                for term in query.split()
+            ),
+        )
+        result = await db.execute(
+            select(Product)
+            .where(SEARCH_VECTOR.op("@@")(tsquery))
+            .order_by(func.ts_rank(SEARCH_VECTOR, tsquery).desc(), Product.id)
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+    await search_index.ensure(db, version)
+    ids = search_index.search(query, limit)
+    if not ids:
+        return []
+    result = await db.execute(select(Product).where(Product.id.in_(ids)))
+    by_id = {product.id: product for product in result.scalars()}
+    # Товар могли удалить после построения индекса
+    return [by_id[pid] for pid in ids if pid in by_id]
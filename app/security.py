@@ -1,4 +1,7 @@
 import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Any, Union
 
@@ -6,12 +9,27 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
 
+from app.metrics import observe_password_hash, record_password_hash_rejected
 from app.schemas.token import TokenData
 
 SECRET_KEY = os.getenv("SECRET_KEY", "secret-key")
 ALGORITHM = "HS256"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Стоимость bcrypt: каждый +1 удваивает время хеширования
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# bcrypt отпускает GIL, поэтому хватает пула потоков
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+# Сколько операций может ждать пул, прежде чем новые запросы получат 503
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS
+)
+
+_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+_pending_hashes = 0
 
 
 def hash_password(password: str) -> str:
@@ -22,6 +40,51 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def _timed(operation: str, func, *args):
+    # Замер внутри потока: без времени ожидания в очереди пула
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        observe_password_hash(operation, time.perf_counter() - started)
+
+
+async def _run_in_hash_executor(operation: str, func, *args):
+    """
+    Выполняет bcrypt вне event loop. Если очередь пула заполнена,
+    сразу отвечает 503, а не копит запросы без ограничения.
+    """
+    global _pending_hashes
+    if _pending_hashes >= PASSWORD_HASH_MAX_PENDING:
+        record_password_hash_rejected()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending_hashes += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, _timed, operation, func, *args)
+    finally:
+        _pending_hashes -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_hash_executor("hash", hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_executor(
+        "verify", verify_password, plain_password, hashed_password
+    )
+
+
+def shutdown_hash_executor() -> None:
+    _hash_executor.shutdown(wait=True, cancel_futures=True)
+
+
 def create_access_token(data: dict[str, Any], expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
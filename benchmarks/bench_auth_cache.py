@@ -0,0 +1,44 @@
+"""
+Задержка GET /api/orders с кэшем аутентифицированных пользователей и без него.
+
+Запуск:
+    python -m benchmarks.bench_auth_cache --requests 2000
+"""
+
+import argparse
+import asyncio
+
+from app.dependencies import principal_cache
+from benchmarks.common import bench_client, summarize, timed
+
+
+async def main(requests: int):
+    async with bench_client() as client:
+        credentials = {"email": "bench@test.com", "password": "pass"}
+        await client.post("/api/register", json=credentials)
+        login = await client.post(
+            "/api/login",
+            data={"username": credentials["email"], "password": credentials["password"]},
+        )
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        maxsize = principal_cache.maxsize
+        for mode, size in (("without cache", 0), ("with cache", maxsize)):
+            principal_cache.clear()
+            principal_cache.maxsize = size
+            # Список заказов берется из Redis, так что остается только поиск пользователя
+            await client.get("/api/orders", headers=headers)
+
+            samples = [
+                await timed(client.get("/api/orders", headers=headers))
+                for _ in range(requests)
+            ]
+            print(f"GET /api/orders {mode:13}: {summarize(samples)}")
+        principal_cache.maxsize = maxsize
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,71 @@
+"""
+Сравнение пропускной способности публикации событий: подключение на каждое
+сообщение (старая реализация send_message) против общего Publisher.
+
+Вместо RabbitMQ используется локальная заглушка, которая имитирует задержки
+сети: установку соединения, открытие канала и подтверждение публикации.
+
+Запуск:
+    python -m benchmarks.bench_broker --messages 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+from aio_pika import DeliveryMode, Message
+
+from app.broker import QUEUE_NAME, Publisher
+from benchmarks.common import StandInPika
+
+
+async def legacy_send_message(event_type: str, data: dict):
+    """Старая реализация: соединение, канал и объявление очереди на каждый вызов"""
+    connection = await StandInPika.connect_robust("amqp://stand-in")
+    async with connection:
+        channel = await connection.channel()
+        await channel.declare_queue(QUEUE_NAME, durable=True)
+        await channel.default_exchange.publish(
+            Message(
+                body=json.dumps({"event": event_type, "data": data}).encode(),
+                delivery_mode=DeliveryMode.PERSISTENT,
+            ),
+            routing_key=QUEUE_NAME,
+        )
+
+
+async def run(send, messages: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            await send("order_created", {"id": i, "user_id": 1, "quantity": 1})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    return messages / (time.perf_counter() - started)
+
+
+async def main(messages: int, concurrency: int):
+    legacy = await run(legacy_send_message, messages, concurrency)
+
+    with patch("app.broker.aio_pika", StandInPika):
+        publisher = Publisher(url="amqp://stand-in")
+        await publisher.start()
+        pooled = await run(publisher.publish, messages, concurrency)
+        await publisher.close()
+
+    print(f"messages={messages} concurrency={concurrency}")
+    print(f"per-call connection: {legacy:10.1f} publishes/sec")
+    print(f"pooled publisher:    {pooled:10.1f} publishes/sec")
+    print(f"speedup:             {pooled / legacy:10.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.concurrency))
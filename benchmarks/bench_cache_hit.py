@@ -0,0 +1,74 @@
+"""
+Стоимость попадания в кэш списка товаров: разбор JSON и повторная валидация
+против отдачи закэшированных байтов как есть.
+
+Запуск:
+    python -m benchmarks.bench_cache_hit --items 100 --repeat 2000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from pydantic import TypeAdapter
+from sqlalchemy import insert
+
+from app.models import Product
+from app.pagination import pack_page, page_response
+from app.schemas.product import ProductResponse
+from benchmarks.common import bench_client, summarize, timed
+
+
+adapter = TypeAdapter(list[ProductResponse])
+
+
+def legacy_hit(cached: str) -> bytes:
+    # Старый путь: json.loads, затем FastAPI валидирует по response_model
+    # и сериализует заново (в 0.143 уже через pydantic, без jsonable_encoder)
+    return adapter.dump_json(adapter.validate_python(json.loads(cached)))
+
+
+def raw_hit(cached: str) -> bytes:
+    return page_response(cached).body
+
+
+def per_call_us(func, arg, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+async def main(items: int, repeat: int, requests: int):
+    products = [
+        {"id": i, "name": f"Product {i}", "price": 1.5 + i} for i in range(1, items + 1)
+    ]
+    legacy_cached = json.dumps(products)
+    body = adapter.dump_json([ProductResponse(**p) for p in products])
+    raw_cached = pack_page(body, None).decode()
+
+    print(f"page of {items} products, {len(body)} bytes")
+    print(f"legacy hit: {per_call_us(legacy_hit, legacy_cached, repeat):9.1f} us/call")
+    print(f"raw hit:    {per_call_us(raw_hit, raw_cached, repeat):9.1f} us/call")
+
+    # Полный HTTP-путь через приложение, кэш уже прогрет
+    async with bench_client() as client:
+        async with client.session_factory() as session:
+            await session.execute(
+                insert(Product), [{"name": p["name"], "price": p["price"]} for p in products]
+            )
+            await session.commit()
+        url = f"/api/products?limit={items}"
+        await client.get(url)
+        samples = [await timed(client.get(url)) for _ in range(requests)]
+        print(f"GET {url} (cache hit): {summarize(samples)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.repeat, args.requests))
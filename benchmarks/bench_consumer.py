@@ -0,0 +1,66 @@
+"""
+Пропускная способность воркера (сообщений в секунду) в зависимости от
+числа одновременных обработчиков.
+
+Обработчик имитирует I/O (запрос в БД или внешний сервис) через asyncio.sleep.
+
+Запуск:
+    python -m benchmarks.bench_consumer --messages 2000 --handler-ms 2
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from worker.consumer import Consumer, HandlerRegistry
+
+
+class StandInMessage:
+    def __init__(self, event_type: str, data: dict):
+        self.body = json.dumps({"event": event_type, "data": data}).encode()
+        self.headers = {}
+
+    async def ack(self):
+        pass
+
+
+async def dead_letter(message, reason):
+    pass
+
+
+async def run(messages: int, concurrency: int, handler_seconds: float, batch: bool) -> float:
+    registry = HandlerRegistry()
+
+    @registry.register("order_created", batch_size=50 if batch else None)
+    async def handler(data):
+        await asyncio.sleep(handler_seconds)
+
+    consumer = Consumer(registry, dead_letter, concurrency=concurrency, batch_timeout=0.005)
+    consumer.start()
+
+    started = time.perf_counter()
+    for i in range(messages):
+        await consumer.on_message(StandInMessage("order_created", {"id": i}))
+    await consumer.drain()
+    return messages / (time.perf_counter() - started)
+
+
+async def main(messages: int, handler_ms: float):
+    handler_seconds = handler_ms / 1000
+    print(f"messages={messages} handler={handler_ms}ms")
+    for concurrency in (1, 2, 4, 8, 16, 32, 64):
+        single = await run(messages, concurrency, handler_seconds, batch=False)
+        batched = await run(messages, concurrency, handler_seconds, batch=True)
+        print(
+            f"concurrency={concurrency:3}: {single:10.1f} msg/sec, "
+            f"micro-batches of 50: {batched:10.1f} msg/sec"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--handler-ms", type=float, default=2)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.handler_ms))
@@ -0,0 +1,111 @@
+"""
+Выгрузка всего каталога: /api/products/export против постраничного обхода.
+
+Запуск:
+    python -m benchmarks.bench_export --products 1000000
+
+Выгрузка читается напрямую через ASGI (httpx.ASGITransport копит тело ответа
+в памяти), поэтому пиковый RSS отражает память самого приложения.
+"""
+
+import argparse
+import asyncio
+import resource
+import time
+
+from app.main import app
+from benchmarks.bench_pagination import seed_products
+from benchmarks.common import bench_client
+
+
+def peak_rss_mb() -> float:
+    # В Linux ru_maxrss в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def export_via_asgi(fmt: str) -> tuple[int, int]:
+    """Возвращает (число строк, число байт), не сохраняя тело ответа"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/products/export",
+        "raw_path": b"/api/products/export",
+        "query_string": f"format={fmt}".encode(),
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+    }
+    counters = {"lines": 0, "bytes": 0}
+    requested = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # StreamingResponse слушает disconnect, пока идет отправка
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            counters["lines"] += body.count(b"\n")
+            counters["bytes"] += len(body)
+
+    await app(scope, receive, send)
+    finished.set()
+    header_lines = 1 if fmt == "csv" else 0
+    return counters["lines"] - header_lines, counters["bytes"]
+
+
+async def paginate(client, limit: int) -> int:
+    rows = 0
+    url = f"/api/products?limit={limit}"
+    while url:
+        response = await client.get(url)
+        rows += len(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        url = f"/api/products?limit={limit}&cursor={cursor}" if cursor else None
+    return rows
+
+
+async def main(products: int, fmt: str, page_limit: int, skip_pages: bool):
+    async with bench_client() as client:
+        await seed_products(client, products)
+        rss_before = peak_rss_mb()
+
+        started = time.perf_counter()
+        rows, size = await export_via_asgi(fmt)
+        elapsed = time.perf_counter() - started
+        print(
+            f"export ({fmt}): {rows} rows, {size / 2**20:.1f} MiB in {elapsed:.2f}s, "
+            f"{rows / elapsed:,.0f} rows/s, "
+            f"peak RSS {rss_before:.1f} -> {peak_rss_mb():.1f} MiB"
+        )
+
+        if skip_pages:
+            return
+        started = time.perf_counter()
+        rows = await paginate(client, page_limit)
+        elapsed = time.perf_counter() - started
+        print(
+            f"pages (limit={page_limit}): {rows} rows in {elapsed:.2f}s, "
+            f"{rows / elapsed:,.0f} rows/s, "
+            f"{len(await client.redis.keys('products:*'))} cache keys left behind"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--page-limit", type=int, default=1000)
+    parser.add_argument("--skip-pages", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.products, args.format, args.page_limit, args.skip_pages))
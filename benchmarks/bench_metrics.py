@@ -0,0 +1,71 @@
+"""
+Накладные расходы метрик: задержка запросов с включенными и выключенными метриками.
+
+Запуск:
+    python -m benchmarks.bench_metrics --requests 2000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import insert
+
+from app import metrics
+from app.models import Product
+from benchmarks.common import bench_client, summarize, timed
+
+
+def per_call_us(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1_000_000
+
+
+async def main(requests: int):
+    # Стоимость отдельных хуков
+    histogram = metrics.HTTP_REQUEST_DURATION.labels("GET", "/bench", "200")
+    print(f"histogram observe:   {per_call_us(lambda: histogram.observe(0.01), 100_000):.2f} us")
+    print(
+        "cache counter hook:  "
+        f"{per_call_us(lambda: metrics.record_cache_lookup('products:0:100', 'hit'), 100_000):.2f} us"
+    )
+
+    async with bench_client() as client:
+        async with client.session_factory() as session:
+            await session.execute(
+                insert(Product), [{"name": f"Product {i}", "price": i} for i in range(1, 101)]
+            )
+            await session.commit()
+
+        # Кэшированный список и страница товара: самые короткие запросы,
+        # на них относительная доля метрик максимальна
+        urls = ["/api/products", "/api/products/1"]
+        for url in urls:
+            await client.get(url)
+
+        samples = {True: [], False: []}
+        for i in range(requests):
+            # Режимы чередуются на каждом запросе (и меняют порядок), чтобы
+            # сборка мусора и фоновые колебания делились между ними поровну
+            for enabled in (i % 2 == 0, i % 2 != 0):
+                metrics.METRICS_ENABLED = enabled
+                samples[enabled].append(await timed(client.get(urls[i // 2 % 2])))
+        metrics.METRICS_ENABLED = True
+
+        for enabled in (False, True):
+            print(f"metrics {'on ' if enabled else 'off'}: {summarize(samples[enabled])}")
+        overhead = statistics.median(samples[True]) - statistics.median(samples[False])
+        print(
+            f"median overhead: {overhead * 1_000_000:.1f} us per request "
+            f"({overhead / statistics.median(samples[False]) * 100:.1f}%)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
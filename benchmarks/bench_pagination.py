@@ -0,0 +1,55 @@
+"""
+Задержка глубокой страницы списка товаров: skip/limit против курсора.
+
+Запуск:
+    python -m benchmarks.bench_pagination --products 200000 --page 1000
+"""
+
+import argparse
+import asyncio
+
+from sqlalchemy import insert
+
+from app.models import Product
+from app.pagination import encode_cursor
+from benchmarks.common import bench_client, summarize, timed
+
+
+async def seed_products(client, count: int) -> None:
+    async with client.session_factory() as session:
+        for start in range(0, count, 10_000):
+            rows = [
+                {"name": f"Product {i}", "price": 1 + i % 1000}
+                for i in range(start, min(start + 10_000, count))
+            ]
+            await session.execute(insert(Product), rows)
+        await session.commit()
+
+
+async def main(products: int, page: int, limit: int, repeat: int):
+    async with bench_client() as client:
+        await seed_products(client, products)
+
+        skip = (page - 1) * limit
+        modes = {
+            "offset": f"/api/products?skip={skip}&limit={limit}",
+            # На странице page последний id предыдущей страницы равен skip
+            "cursor": f"/api/products?limit={limit}&cursor={encode_cursor(id=skip)}",
+        }
+        for mode, url in modes.items():
+            samples = []
+            for _ in range(repeat):
+                # Замеряем БД, а не кэш
+                await client.redis.flushall()
+                samples.append(await timed(client.get(url)))
+            print(f"page {page} ({mode:6}): {summarize(samples)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=200_000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.products, args.page, args.limit, args.repeat))
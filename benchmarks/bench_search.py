@@ -0,0 +1,91 @@
+"""
+Поиск товаров на большом каталоге: построение индекса, запросы без кэша и из кэша.
+
+Без BENCH_DATABASE_URL используется SQLite и локальный индекс; с PostgreSQL
+бенчмарк сам добавляет generated-столбец и GIN-индекс, как миграция.
+
+Запуск:
+    python -m benchmarks.bench_search --products 1000000 --repeat 200
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import insert, text
+
+from app.cache import PRODUCT_SEARCH_TAG, invalidate_tags
+from app.models import Product
+from benchmarks.common import bench_client, summarize, timed
+
+BRANDS = [f"brand{i}" for i in range(200)]
+KINDS = [
+    "laptop", "phone", "tablet", "monitor", "keyboard", "mouse", "headphones",
+    "speaker", "camera", "router", "charger", "cable", "watch", "printer",
+]
+WORDS = ["pro", "air", "mini", "max", "ultra", "lite", "plus", "neo", "one", "go"]
+
+QUERIES = ["laptop", "lap", "phone pro", "brand17 watch", "ultra mini cam", "b", "nothing"]
+
+PG_SEARCH_DDL = [
+    """
+    ALTER TABLE products
+    ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, name)) STORED
+    """,
+    "CREATE INDEX ix_products_search_vector ON products USING gin (search_vector)",
+]
+
+
+def product_names(count: int):
+    rng = random.Random(42)
+    for i in range(count):
+        yield (
+            f"{rng.choice(BRANDS)} {rng.choice(KINDS)} "
+            f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i % 1000}"
+        )
+
+
+async def main(products: int, repeat: int):
+    async with bench_client() as client:
+        started = time.perf_counter()
+        async with client.session_factory() as session:
+            batch = []
+            for name in product_names(products):
+                batch.append({"name": name, "price": 10})
+                if len(batch) == 10_000:
+                    await session.execute(insert(Product), batch)
+                    batch = []
+            if batch:
+                await session.execute(insert(Product), batch)
+            if session.bind.dialect.name == "postgresql":
+                for ddl in PG_SEARCH_DDL:
+                    await session.execute(text(ddl))
+            await session.commit()
+        print(f"loaded {products} products in {time.perf_counter() - started:.1f}s")
+
+        # Первый запрос строит локальный индекс (на PostgreSQL его нет)
+        build = await timed(client.get("/api/products/search", params={"q": "warmup"}))
+        print(f"first search (index build on SQLite): {build:.2f}s")
+
+        for q in QUERIES:
+            cold = []
+            for _ in range(max(1, repeat // 10)):
+                await invalidate_tags(client.redis, PRODUCT_SEARCH_TAG)
+                cold.append(await timed(client.get("/api/products/search", params={"q": q})))
+            hot = [
+                await timed(client.get("/api/products/search", params={"q": q}))
+                for _ in range(repeat)
+            ]
+            found = len((await client.get("/api/products/search", params={"q": q})).json())
+            print(f"q={q!r:18} found={found:3} uncached {summarize(cold)}")
+            print(f"{'':29} cached   {summarize(hot)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.products, args.repeat))
@@ -0,0 +1,136 @@
+"""
+Общая обвязка для бенчмарков: приложение запускается в процессе через
+httpx.ASGITransport (как в tests/conftest.py), а внешние сервисы заменены
+SQLite, fakeredis и заглушкой RabbitMQ.
+"""
+
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+import fakeredis.aioredis
+from httpx import ASGITransport, AsyncClient
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.broker import publisher
+from app.cache import get_redis_client
+from app.database import Base, get_async_session
+from app.main import app
+
+# Задержки заглушки брокера, в секундах
+BROKER_CONNECT_LATENCY = 0.005  # TCP + AMQP handshake
+BROKER_RTT = 0.0005  # один сетевой round-trip
+
+
+class StandInExchange:
+    async def publish(self, message, routing_key, **kwargs):
+        # Ожидание publisher confirm
+        await asyncio.sleep(BROKER_RTT)
+
+
+class StandInChannel:
+    is_closed = False
+
+    def __init__(self):
+        self.default_exchange = StandInExchange()
+
+    async def declare_queue(self, name, durable=False):
+        await asyncio.sleep(BROKER_RTT)
+
+
+class StandInConnection:
+    async def channel(self, publisher_confirms=True):
+        await asyncio.sleep(BROKER_RTT)
+        return StandInChannel()
+
+    async def close(self):
+        await asyncio.sleep(BROKER_RTT)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class StandInPika:
+    """Локальная заглушка aio_pika с имитацией сетевых задержек"""
+
+    @staticmethod
+    async def connect_robust(url):
+        await asyncio.sleep(BROKER_CONNECT_LATENCY)
+        return StandInConnection()
+
+
+@asynccontextmanager
+async def bench_client():
+    """
+    HTTP-клиент к приложению. База - временный файл SQLite, если не задан
+    BENCH_DATABASE_URL (например, локальный PostgreSQL), Redis - fakeredis,
+    если не задан BENCH_REDIS_URL (база в нем очищается).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = os.getenv(
+            "BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{tmp}/bench.db"
+        )
+        engine = create_async_engine(database_url)
+        session_factory = async_sessionmaker(
+            engine, class_=AsyncSession, expire_on_commit=False
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+        redis_url = os.getenv("BENCH_REDIS_URL")
+        if redis_url:
+            redis = Redis.from_url(redis_url, decode_responses=True)
+            await redis.flushdb()
+        else:
+            redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+        async def override_get_async_session():
+            async with session_factory() as session:
+                yield session
+
+        async def override_get_redis_client():
+            return redis
+
+        app.dependency_overrides[get_async_session] = override_get_async_session
+        app.dependency_overrides[get_redis_client] = override_get_redis_client
+        try:
+            with patch("app.broker.aio_pika", StandInPika):
+                transport = ASGITransport(app=app)
+                async with AsyncClient(transport=transport, base_url="http://bench") as client:
+                    client.session_factory = session_factory
+                    client.redis = redis
+                    yield client
+                await publisher.close()
+        finally:
+            app.dependency_overrides.clear()
+            await redis.aclose()
+            await engine.dispose()
+
+
+async def timed(coro) -> float:
+    started = time.perf_counter()
+    await coro
+    return time.perf_counter() - started
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    """Перцентили задержки в миллисекундах"""
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    return {
+        "p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(pct(0.95), 3),
+        "p99_ms": round(pct(0.99), 3),
+    }
@@ -0,0 +1,264 @@
+"""
+Нагрузочный прогон основных сценариев API: RPS и p50/p95/p99 задержки.
+
+Результаты сохраняются в JSON; с --compare прогон сравнивается с прошлым
+и завершается с кодом 1, если какой-то сценарий стал хуже порога.
+
+Запуск:
+    python -m benchmarks.suite --requests 1000 --concurrency 10
+    python -m benchmarks.suite --output new.json --compare baseline.json
+    python -m benchmarks.suite --compare baseline.json --against new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from httpx import AsyncClient, Response
+from sqlalchemy import insert
+
+from app.cache import PRODUCTS_TAG, invalidate_products
+from app.models import Product
+from benchmarks.common import bench_client, summarize
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SEED_PRODUCTS = 100
+SEED_ORDERS = 20
+
+
+@dataclass
+class Scenario:
+    name: str
+    request: Callable[[AsyncClient, dict, int], Awaitable[Response]]
+    # Подготовка перед запросом, в задержку не входит (но входит в RPS)
+    prepare: Callable[[AsyncClient, dict, int], Awaitable[None]] | None = None
+    # Доля от --requests: регистрация и вход упираются в bcrypt
+    share: float = 1.0
+
+
+def _register(client, ctx, i):
+    return client.post(
+        "/api/register", json={"email": f"bench{i}@test.com", "password": "pass"}
+    )
+
+
+def _login(client, ctx, i):
+    return client.post("/api/login", data=ctx["login_form"])
+
+
+def _list_products(client, ctx, i):
+    return client.get("/api/products")
+
+
+async def _drop_products_cache(client, ctx, i):
+    await invalidate_products(client.redis, PRODUCTS_TAG)
+
+
+def _get_product(client, ctx, i):
+    product_id = ctx["product_ids"][i % len(ctx["product_ids"])]
+    return client.get(f"/api/products/{product_id}")
+
+
+def _create_order(client, ctx, i):
+    product_id = ctx["product_ids"][i % len(ctx["product_ids"])]
+    return client.post(
+        "/api/orders",
+        json={"product_id": product_id, "quantity": 1},
+        headers=ctx["headers"],
+    )
+
+
+def _list_orders(client, ctx, i):
+    return client.get("/api/orders", headers=ctx["headers"])
+
+
+def _update_order(client, ctx, i):
+    order_id = ctx["order_ids"][i % len(ctx["order_ids"])]
+    return client.put(
+        f"/api/orders/{order_id}",
+        json={"status": "cancelled" if i % 2 else "pending"},
+        headers=ctx["headers"],
+    )
+
+
+SCENARIOS = [
+    Scenario("register", _register, share=0.05),
+    Scenario("login", _login, share=0.05),
+    Scenario("products_list_hit", _list_products),
+    Scenario("products_list_miss", _list_products, prepare=_drop_products_cache),
+    Scenario("product_get", _get_product),
+    Scenario("order_create", _create_order),
+    Scenario("orders_list", _list_orders),
+    Scenario("order_update", _update_order),
+]
+
+
+async def seed(client: AsyncClient) -> dict:
+    async with client.session_factory() as session:
+        result = await session.execute(
+            insert(Product).returning(Product.id),
+            [{"name": f"Product {i}", "price": i} for i in range(1, SEED_PRODUCTS + 1)],
+        )
+        product_ids = list(result.scalars())
+        await session.commit()
+
+    credentials = {"email": "buyer@test.com", "password": "pass"}
+    await client.post("/api/register", json=credentials)
+    login_form = {"username": credentials["email"], "password": credentials["password"]}
+    login = await client.post("/api/login", data=login_form)
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    order_ids = []
+    for i in range(SEED_ORDERS):
+        response = await client.post(
+            "/api/orders",
+            json={"product_id": product_ids[i], "quantity": 1},
+            headers=headers,
+        )
+        order_ids.append(response.json()["id"])
+
+    return {
+        "product_ids": product_ids,
+        "order_ids": order_ids,
+        "login_form": login_form,
+        "headers": headers,
+    }
+
+
+async def run_scenario(
+    client: AsyncClient, ctx: dict, scenario: Scenario, requests: int, concurrency: int
+) -> dict:
+    # Прогрев (кэши, подготовленные выражения) на отдельных индексах
+    for i in range(requests, requests + max(1, requests // 20)):
+        if scenario.prepare is not None:
+            await scenario.prepare(client, ctx, i)
+        await scenario.request(client, ctx, i)
+
+    indices = iter(range(requests))
+    samples: list[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        for i in indices:
+            if scenario.prepare is not None:
+                await scenario.prepare(client, ctx, i)
+            started = time.perf_counter()
+            response = await scenario.request(client, ctx, i)
+            samples.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        **summarize(samples),
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_suite(names: list[str], requests: int, concurrency: int) -> dict:
+    results = {}
+    async with bench_client() as client:
+        ctx = await seed(client)
+        for scenario in SCENARIOS:
+            if names and scenario.name not in names:
+                continue
+            count = max(1, int(requests * scenario.share))
+            results[scenario.name] = await run_scenario(
+                client, ctx, scenario, count, min(concurrency, count)
+            )
+            print(f"{scenario.name:20} {results[scenario.name]}")
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "database": os.getenv("BENCH_DATABASE_URL", "sqlite").split(":", 1)[0],
+            "redis": "redis" if os.getenv("BENCH_REDIS_URL") else "fakeredis",
+            "requests": requests,
+            "concurrency": concurrency,
+        },
+        "scenarios": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Печатает изменения RPS и p95 по сценариям и возвращает список регрессий:
+    падение RPS или рост p95 больше чем на threshold (доля).
+    """
+    regressions = []
+    print(f"{'scenario':20} {'rps':>10} {'delta':>8} {'p95_ms':>10} {'delta':>8}")
+    for name, new in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        rps_delta = new["rps"] / old["rps"] - 1
+        p95_delta = new["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        print(
+            f"{name:20} {new['rps']:>10} {rps_delta:>+8.1%} "
+            f"{new['p95_ms']:>10} {p95_delta:>+8.1%}"
+        )
+        if rps_delta < -threshold or p95_delta > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--scenario", action="append", default=[],
+        choices=[s.name for s in SCENARIOS], help="можно указать несколько раз",
+    )
+    parser.add_argument("--output", type=Path, help="по умолчанию benchmarks/results/<время>.json")
+    parser.add_argument("--compare", type=Path, help="JSON прошлого прогона")
+    parser.add_argument("--against", type=Path, help="сравнить с готовым JSON без прогона")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.against:
+        current = json.loads(args.against.read_text())
+    else:
+        current = asyncio.run(run_suite(args.scenario, args.requests, args.concurrency))
+        output = args.output or RESULTS_DIR / (
+            datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(current, indent=2))
+        print(f"saved to {output}")
+
+    if args.compare:
+        regressions = compare(json.loads(args.compare.read_text()), current, args.threshold)
+        if regressions:
+            print(f"regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,23 @@
 import asyncio
+from contextlib import contextmanager
 from typing import AsyncGenerator
 from unittest.mock import AsyncMock, patch
 
 import fakeredis.aioredis
 import pytest
 from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
+from app.broker import publisher
 from app.cache import get_redis_client
 from app.database import Base, get_async_session
+from app.dependencies import principal_cache
 from app.main import app
+from app.product_cache import product_cache
+from app.search import search_index
 from app.models import Order, Product, User
 
 # Используем in-memory SQLite для тестов
@@ -64,6 +70,47 @@ async def redis_mock():
     await redis.flushall()
 
 
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    """Между тестами БД пересоздается, поэтому кэш пользователей тоже сбрасываем"""
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_product_cache():
+    """То же для локального кэша и поискового индекса товаров"""
+    product_cache.clear()
+    search_index.clear()
+    yield
+    product_cache.clear()
+    search_index.clear()
+
+
+@pytest.fixture
+def query_counter():
+    """
+    Собирает SQL-запросы к тестовой БД внутри блока:
+
+        with query_counter() as queries:
+            await ac.put(...)
+        assert len(queries) == 1
+    """
+
+    @contextmanager
+    def counter():
+        queries = []
+        listener = lambda conn, cursor, statement, *args: queries.append(statement)
+        event.listen(engine.sync_engine, "before_cursor_execute", listener)
+        try:
+            yield queries
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", listener)
+
+    return counter
+
+
 # Mock для RabbitMQ
 @pytest.fixture(autouse=True)
 async def mock_rabbitmq():
@@ -81,9 +128,13 @@ async def mock_rabbitmq():
         mock_connection.__aexit__.return_value = None
 
         mock_connection.channel.return_value = mock_channel
+        mock_channel.is_closed = False
 
         yield mock_pika
 
+        # Издатель общий на процесс: сбрасываем его, чтобы не тянуть мок в другой тест
+        await publisher.close()
+
 
 # Подмена зависимостей)
 @pytest.fixture(scope="function")
@@ -0,0 +1,66 @@
+import asyncio
+from unittest.mock import patch
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+from redis.asyncio import ConnectionPool, Redis
+
+from app.main import app
+from app.outbox import outbox_relay
+from app.product_cache import product_cache
+from tests.conftest import TestingSessionLocal
+
+
+@pytest.fixture
+async def fake_redis_pool():
+    """Пул приложения, который вместо Redis ходит в fakeredis"""
+    pool = ConnectionPool(
+        server=fakeredis.FakeServer(),
+        connection_class=fakeredis.aioredis.FakeConnection,
+        decode_responses=True,
+    )
+    with patch("app.cache._pool", pool):
+        yield pool
+
+
+async def wait_for(condition, attempts: int = 50) -> bool:
+    for _ in range(attempts):
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+@pytest.mark.asyncio
+async def test_lifespan_starts_product_cache_listener(init_db, fake_redis_pool):
+    other_worker = Redis(connection_pool=fake_redis_pool)
+
+    # Пул хэширования общий на процесс: его закрытие сломало бы остальные тесты
+    with (
+        patch.object(outbox_relay, "session_factory", TestingSessionLocal),
+        patch("app.main.shutdown_hash_executor"),
+    ):
+        async with app.router.lifespan_context(app):
+            listener = product_cache._listener
+            assert listener.running
+
+            async def subscribers() -> int:
+                return dict(await other_worker.pubsub_numsub("product_invalidations"))[
+                    "product_invalidations"
+                ]
+
+            # Подписчик должен подписаться на канал, а не упасть на старте
+            for _ in range(50):
+                if await subscribers() or not listener.running:
+                    break
+                await asyncio.sleep(0.01)
+            assert listener.running
+            assert await subscribers() == 1
+
+            product_cache.local.set(1, object())
+            # Изменение товара в другом воркере
+            await other_worker.publish("product_invalidations", "[1]")
+            assert await wait_for(lambda: product_cache.local.get(1) is None)
+
+    assert not product_cache._listener.running
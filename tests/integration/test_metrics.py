@@ -0,0 +1,49 @@
+import pytest
+from prometheus_client import REGISTRY
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_cover_hot_paths(ac):
+    route = {"method": "GET", "route": "/api/products/{product_id}", "status": "404"}
+    before = {
+        "route": sample("http_request_duration_seconds_count", **route),
+        "miss": sample("cache_requests_total", cache="products", result="miss"),
+        "hit": sample("cache_requests_total", cache="products", result="hit"),
+        "select": sample("db_query_duration_seconds_count", operation="SELECT"),
+        "hash": sample("password_hash_duration_seconds_count", operation="hash"),
+    }
+
+    await ac.post("/api/register", json={"email": "metrics@test.com", "password": "pass"})
+    await ac.get("/api/products/41")
+    await ac.get("/api/products/42")
+    await ac.get("/api/products")
+    await ac.get("/api/products")
+
+    # Метка route - шаблон пути, оба запроса попадают в один ряд
+    assert sample("http_request_duration_seconds_count", **route) == before["route"] + 2
+    assert sample("cache_requests_total", cache="products", result="miss") == before["miss"] + 1
+    assert sample("cache_requests_total", cache="products", result="hit") == before["hit"] + 1
+    assert sample("db_query_duration_seconds_count", operation="SELECT") > before["select"]
+    assert sample("password_hash_duration_seconds_count", operation="hash") == before["hash"] + 1
+
+    response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Значения из /stats тоже экспортируются
+    assert "shop_product_cache_misses" in response.text
+    assert "shop_outbox_relay_published" in response.text
+
+
+@pytest.mark.asyncio
+async def test_metrics_keep_stats_in_multiprocess_mode(ac, tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+
+    response = await ac.get("/metrics")
+
+    assert response.status_code == 200
+    assert "shop_product_cache_misses" in response.text
+    assert "shop_outbox_relay_published" in response.text
@@ -1,5 +1,10 @@
+import json
+
 import pytest
 from unittest.mock import AsyncMock, patch
+from sqlalchemy import event, select
+
+from app.models import OutboxEvent
 
 
 async def create_user_and_product(ac):
@@ -23,22 +28,24 @@ async def create_user_and_product(ac):
 
 
 @pytest.mark.asyncio
-async def test_create_order_with_mq(ac):
+async def test_create_order_with_mq(ac, db_session, mock_rabbitmq):
     headers, product_id = await create_user_and_product(ac)
 
     order_data = {"product_id": product_id, "quantity": 2}
+    response = await ac.post("/api/orders", json=order_data, headers=headers)
 
-    # Мокаем RabbitMQ отправку
-    with patch("app.routers.orders.send_message", new_callable=AsyncMock) as mock_send:
-        response = await ac.post("/api/orders", json=order_data, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["status"] == "pending"
 
-        assert response.status_code == 201
-        assert response.json()["status"] == "pending"
-
-        # Проверяем отправку сообщения
-        mock_send.assert_called_once()
-        assert mock_send.call_args[1]["event_type"] == "order_created"
-        assert mock_send.call_args[1]["data"]["product_id"] == product_id
+    # Событие записано в outbox, а HTTP-запрос не ходит в RabbitMQ
+    event = (
+        await db_session.execute(
+            select(OutboxEvent).where(OutboxEvent.event_type == "order_created")
+        )
+    ).scalar_one()
+    assert event.payload["product_id"] == product_id
+    assert event.sent_at is None
+    mock_rabbitmq.connect_robust.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -46,15 +53,269 @@ async def test_get_orders(ac):
     headers, product_id = await create_user_and_product(ac)
 
     # Создаем заказ
-    with patch("app.routers.orders.send_message", new_callable=AsyncMock):
-        await ac.post(
-            "/api/orders",
-            json={"product_id": product_id, "quantity": 1},
-            headers=headers,
-        )
+    await ac.post(
+        "/api/orders",
+        json={"product_id": product_id, "quantity": 1},
+        headers=headers,
+    )
 
     # Получаем список
     response = await ac.get("/api/orders", headers=headers)
     assert response.status_code == 200
     assert len(response.json()) == 1
     assert response.json()[0]["product_id"] == product_id
+
+
+async def create_order_and_list(ac, headers, product_id):
+    await ac.post(
+        "/api/orders",
+        json={"product_id": product_id, "quantity": 1},
+        headers=headers,
+    )
+    response = await ac.get("/api/orders", headers=headers)
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_order_cache_invalidation_never_uses_keys(ac, redis_mock):
+    headers, product_id = await create_user_and_product(ac)
+
+    with patch.object(redis_mock, "keys", new_callable=AsyncMock) as mock_keys:
+        # Кэшируем пустой список, затем создаем заказ: список должен обновиться
+        assert (await ac.get("/api/orders", headers=headers)).json() == []
+        orders = await create_order_and_list(ac, headers, product_id)
+        assert len(orders) == 1
+
+        order_id = orders[0]["id"]
+        await ac.put(
+            f"/api/orders/{order_id}", json={"status": "cancelled"}, headers=headers
+        )
+        response = await ac.get("/api/orders", headers=headers)
+        assert response.json()[0]["status"] == "cancelled"
+
+        await ac.delete(f"/api/orders/{order_id}", headers=headers)
+        assert (await ac.get("/api/orders", headers=headers)).json() == []
+
+    mock_keys.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_order_cache_scan_fallback(ac, redis_mock, monkeypatch):
+    monkeypatch.setattr("app.cache.ORDERS_CACHE_INVALIDATION", "scan")
+    headers, product_id = await create_user_and_product(ac)
+
+    with patch.object(redis_mock, "keys", new_callable=AsyncMock) as mock_keys:
+        await ac.get("/api/orders", headers=headers)
+        assert await redis_mock.exists("orders:1:None:0:100")
+
+        orders = await create_order_and_list(ac, headers, product_id)
+        assert len(orders) == 1
+
+    mock_keys.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_order_cache_tags_mode(ac, redis_mock, monkeypatch):
+    monkeypatch.setattr("app.cache.ORDERS_CACHE_INVALIDATION", "tags")
+    headers, product_id = await create_user_and_product(ac)
+
+    await ac.get("/api/orders", headers=headers)
+    assert "orders:1:None:0:100" in await redis_mock.smembers("tag:orders:1")
+
+    orders = await create_order_and_list(ac, headers, product_id)
+    assert len(orders) == 1
+
+
+@pytest.mark.asyncio
+async def test_order_cursor_pagination(ac):
+    headers, product_id = await create_user_and_product(ac)
+    for quantity in range(1, 4):
+        await ac.post(
+            "/api/orders",
+            json={"product_id": product_id, "quantity": quantity},
+            headers=headers,
+        )
+
+    first = await ac.get("/api/orders?limit=2", headers=headers)
+    assert [o["quantity"] for o in first.json()] == [3, 2]
+
+    cursor = first.headers["X-Next-Cursor"]
+    second = await ac.get(f"/api/orders?limit=2&cursor={cursor}", headers=headers)
+    assert [o["quantity"] for o in second.json()] == [1]
+    assert "X-Next-Cursor" not in second.headers
+
+
+@pytest.mark.asyncio
+async def test_create_orders_batch(ac, db_session):
+    headers, product_id = await create_user_and_product(ac)
+    items = [{"product_id": product_id, "quantity": q} for q in (1, 2, 3)]
+
+    queries = []
+    sync_engine = db_session.bind.sync_engine
+    listener = lambda conn, cursor, statement, *args: queries.append(statement)
+    event.listen(sync_engine, "before_cursor_execute", listener)
+    try:
+        response = await ac.post("/api/orders/batch", json={"items": items}, headers=headers)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", listener)
+
+    assert response.status_code == 201
+    assert [o["quantity"] for o in response.json()] == [1, 2, 3]
+    assert all(o["created_at"] for o in response.json())
+
+    # Проверка товаров одним IN. На PostgreSQL заказы вставляются одним INSERT,
+    # SQLite ради порядка RETURNING выполняет его построчно
+    assert sum("FROM products" in q for q in queries) == 1
+
+    events = (await db_session.execute(select(OutboxEvent))).scalars().all()
+    assert [e.event_type for e in events if e.event_type.startswith("orders")] == [
+        "orders_created"
+    ]
+    assert len((await ac.get("/api/orders", headers=headers)).json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_create_orders_batch_is_all_or_nothing(ac):
+    headers, product_id = await create_user_and_product(ac)
+    items = [
+        {"product_id": product_id, "quantity": 1},
+        {"product_id": 999, "quantity": 1},
+    ]
+
+    response = await ac.post("/api/orders/batch", json={"items": items}, headers=headers)
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == [
+        {"index": 1, "product_id": 999, "detail": "Product not found"}
+    ]
+    assert (await ac.get("/api/orders", headers=headers)).json() == []
+
+
+@pytest.mark.asyncio
+async def test_export_orders_only_own(ac):
+    headers, product_id = await create_user_and_product(ac)
+    for quantity in (1, 2):
+        await ac.post(
+            "/api/orders", json={"product_id": product_id, "quantity": quantity}, headers=headers
+        )
+
+    await ac.post("/api/register", json={"email": "other@test.com", "password": "pass"})
+    login = await ac.post("/api/login", data={"username": "other@test.com", "password": "pass"})
+    other = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    await ac.post("/api/orders", json={"product_id": product_id, "quantity": 9}, headers=other)
+
+    response = await ac.get("/api/orders/export", headers=headers)
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r["quantity"], r["status"]) for r in rows] == [(1, "pending"), (2, "pending")]
+
+    csv_response = await ac.get("/api/orders/export?format=csv&status=completed", headers=headers)
+    assert csv_response.text.splitlines() == [
+        "id,product_id,quantity,status,created_at,updated_at"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_orders_conditional_get(ac):
+    headers, product_id = await create_user_and_product(ac)
+
+    first = await ac.get("/api/orders", headers=headers)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    not_modified = await ac.get("/api/orders", headers={**headers, "If-None-Match": etag})
+    assert not_modified.status_code == 304
+
+    await ac.post("/api/orders", json={"product_id": product_id, "quantity": 1}, headers=headers)
+    changed = await ac.get("/api/orders", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert len(changed.json()) == 1
+
+
+@pytest.mark.asyncio
+async def test_order_writes_are_single_statements(ac, query_counter):
+    headers, product_id = await create_user_and_product(ac)
+    # Товар и пользователь уже в кэшах, считаем только запросы записи
+    await ac.get(f"/api/products/{product_id}")
+
+    with query_counter() as queries:
+        created = await ac.post(
+            "/api/orders", json={"product_id": product_id, "quantity": 1}, headers=headers
+        )
+    assert created.status_code == 201
+    assert created.json()["created_at"]
+    # Заказ, сводка и событие outbox в одной транзакции, без SELECT после commit
+    assert [q.split()[:3] for q in queries] == [
+        ["INSERT", "INTO", "orders"],
+        ["INSERT", "INTO", "user_order_stats"],
+        ["INSERT", "INTO", "outbox"],
+    ]
+    order_id = created.json()["id"]
+
+    with query_counter() as queries:
+        updated = await ac.put(
+            f"/api/orders/{order_id}", json={"status": "cancelled"}, headers=headers
+        )
+    assert updated.json()["status"] == "cancelled"
+    assert updated.json()["updated_at"]
+    # На PostgreSQL прежний статус приходит из того же UPDATE (CTE), на SQLite
+    # читается перед ним; отмена уменьшает сумму в сводке
+    assert [q.split()[:2] for q in queries] == [
+        ["SELECT", "orders.status"],
+        ["UPDATE", "orders"],
+        ["UPDATE", "user_order_stats"],
+    ]
+
+    with query_counter() as queries:
+        deleted = await ac.delete(f"/api/orders/{order_id}", headers=headers)
+        missing = await ac.delete(f"/api/orders/{order_id}", headers=headers)
+    assert deleted.status_code == 204
+    assert missing.status_code == 404
+    assert [q.split()[:2] for q in queries] == [
+        ["DELETE", "FROM"],
+        ["UPDATE", "user_order_stats"],
+        ["DELETE", "FROM"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_order_price_snapshot_and_summary(ac):
+    headers, product_id = await create_user_and_product(ac)
+    empty = await ac.get("/api/orders/summary", headers=headers)
+    assert empty.json() == {"order_count": 0, "total_spent": "0", "last_order_at": None}
+
+    first = await ac.post(
+        "/api/orders", json={"product_id": product_id, "quantity": 3}, headers=headers
+    )
+    assert first.json()["unit_price"] == "500.00"
+    assert first.json()["total"] == "1500.00"
+
+    # Новая цена не меняет уже оформленный заказ
+    await ac.put(f"/api/products/{product_id}", json={"price": 19.99}, headers=headers)
+    batch = await ac.post(
+        "/api/orders/batch",
+        json={"items": [{"product_id": product_id, "quantity": 3}] * 2},
+        headers=headers,
+    )
+    assert [o["total"] for o in batch.json()] == ["59.97", "59.97"]
+    first_again = await ac.get(f"/api/orders/{first.json()['id']}", headers=headers)
+    assert first_again.json()["unit_price"] == "500.00"
+
+    summary = (await ac.get("/api/orders/summary", headers=headers)).json()
+    assert summary["order_count"] == 3
+    assert summary["total_spent"] == "1619.94"
+    assert summary["last_order_at"]
+
+    # Отмена убирает заказ из суммы, возврат из отмены - добавляет обратно
+    await ac.put(f"/api/orders/{first.json()['id']}", json={"status": "cancelled"}, headers=headers)
+    summary = (await ac.get("/api/orders/summary", headers=headers)).json()
+    assert (summary["order_count"], summary["total_spent"]) == (3, "119.94")
+
+    await ac.delete(f"/api/orders/{batch.json()[0]['id']}", headers=headers)
+    await ac.delete(f"/api/orders/{first.json()['id']}", headers=headers)
+    summary = (await ac.get("/api/orders/summary", headers=headers)).json()
+    assert (summary["order_count"], summary["total_spent"]) == (1, "59.97")
+
+    await ac.delete(f"/api/orders/{batch.json()[1]['id']}", headers=headers)
+    summary = (await ac.get("/api/orders/summary", headers=headers)).json()
+    assert summary == {"order_count": 0, "total_spent": "0.00", "last_order_at": None}
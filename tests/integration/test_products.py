@@ -1,6 +1,9 @@
+import asyncio
 import json
+import time
 
 import pytest
+from sqlalchemy import event
 
 
 async def get_token(ac, email="admin@test.com"):
@@ -28,10 +31,13 @@ async def test_create_and_read_product(ac, redis_mock):
     assert response.status_code == 200
     assert len(response.json()) == 1
 
-    # 3. Проверка кэша
+    # 3. Проверка кэша: после строки курсора лежит ровно тело ответа
     cached_data = await redis_mock.get("products:0:100")
     assert cached_data is not None
-    assert json.loads(cached_data)[0]["name"] == "Test Laptop"
+    cursor_line, _, body = cached_data.partition("\n")
+    assert cursor_line == ""
+    assert body.encode() == response.content
+    assert json.loads(body)[0]["name"] == "Test Laptop"
 
 
 @pytest.mark.asyncio
@@ -54,3 +60,444 @@ async def test_update_product_invalidates_cache(ac, redis_mock):
 
     # Проверяем, что кэш удален (инвалидирован)
     assert await redis_mock.get("products:0:100") is None
+
+
+@pytest.mark.asyncio
+async def test_product_writes_invalidate_every_affected_page(ac, redis_mock):
+    token = await get_token(ac, email="pager@test.com")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    ids = []
+    for i in range(3):
+        resp = await ac.post(
+            "/api/products", json={"name": f"Item {i}", "price": 10}, headers=headers
+        )
+        ids.append(resp.json()["id"])
+
+    # Кэшируем две страницы по одному товару
+    await ac.get("/api/products?skip=0&limit=1")
+    await ac.get("/api/products?skip=1&limit=1")
+
+    # Обновление второго товара сбрасывает только его страницу
+    await ac.put(f"/api/products/{ids[1]}", json={"name": "Renamed"}, headers=headers)
+    assert await redis_mock.get("products:0:1") is not None
+    assert await redis_mock.get("products:1:1") is None
+
+    response = await ac.get("/api/products?skip=1&limit=1")
+    assert response.json()[0]["name"] == "Renamed"
+
+    # Создание товара сбрасывает все страницы, а не только products:0:100
+    await ac.post("/api/products", json={"name": "Item 3", "price": 10}, headers=headers)
+    assert await redis_mock.get("products:0:1") is None
+    assert await redis_mock.get("products:1:1") is None
+
+
+@pytest.mark.asyncio
+async def test_expired_product_list_hits_db_once(ac, redis_mock, db_session):
+    token = await get_token(ac, email="stampede@test.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    await ac.post("/api/products", json={"name": "Hot item", "price": 1}, headers=headers)
+
+    queries = []
+
+    def count_product_selects(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM products" in statement:
+            queries.append(statement)
+
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count_product_selects)
+    try:
+        # Истечение горячего ключа и 20 одновременных запросов
+        responses = await asyncio.gather(*(ac.get("/api/products") for _ in range(20)))
+        assert len(queries) == 1
+
+        # Логически устаревшее значение: все получают ответ, обновляет один
+        queries.clear()
+        await redis_mock.set("products:0:100:meta", f"{time.time() - 1}:0")
+        responses += await asyncio.gather(*(ac.get("/api/products") for _ in range(20)))
+        assert len(queries) == 1
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count_product_selects)
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all(r.json()[0]["name"] == "Hot item" for r in responses)
+
+
+@pytest.mark.asyncio
+async def test_product_cursor_pagination(ac):
+    token = await get_token(ac, email="cursor@test.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(5):
+        await ac.post("/api/products", json={"name": f"Item {i}", "price": 1}, headers=headers)
+
+    names = []
+    response = await ac.get("/api/products?limit=2")
+    while True:
+        assert response.status_code == 200
+        names += [p["name"] for p in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = await ac.get(f"/api/products?limit=2&cursor={cursor}")
+
+    assert names == [f"Item {i}" for i in range(5)]
+
+    response = await ac.get("/api/products?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_product_cursor_values_must_match_sort(ac):
+    from app.pagination import encode_cursor
+
+    unsigned = "eyJpZCI6MX0"  # {"id":1} без подписи
+    response = await ac.get("/api/products", params={"cursor": unsigned})
+    assert response.status_code == 400
+
+    forged = [
+        ("name", encode_cursor(id=1, name=5)),
+        ("price", encode_cursor(id=1, price="cheap")),
+        ("price", encode_cursor(id=1, price=True)),
+        ("price", encode_cursor(price=10)),
+        ("id", encode_cursor(id=True)),
+    ]
+    for sort, cursor in forged:
+        response = await ac.get("/api/products", params={"sort": sort, "cursor": cursor})
+        assert response.status_code == 400, (sort, cursor)
+        assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_ndjson_upserts(ac, redis_mock, monkeypatch):
+    from app import product_import
+
+    monkeypatch.setattr(product_import, "PRODUCT_IMPORT_CHUNK_SIZE", 2)
+    token = await get_token(ac, email="importer@test.com")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    existing = await ac.post(
+        "/api/products", json={"name": "Old name", "price": 10}, headers=headers
+    )
+    existing_id = existing.json()["id"]
+    await ac.get("/api/products")
+    assert await redis_mock.get("products:0:100") is not None
+
+    lines = [
+        {"name": "Keyboard", "price": 30},
+        {"id": existing_id, "name": "New name", "price": 12},
+        {"name": "x", "price": 1},
+        {"name": "Mouse", "price": 15},
+        {"id": 500, "name": "Monitor", "price": 200},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\n{broken\n"
+
+    async def chunks():
+        # Границы чанков не совпадают с границами строк
+        data = body.encode()
+        for i in range(0, len(data), 7):
+            yield data[i : i + 7]
+
+    response = await ac.post(
+        "/api/products/bulk",
+        content=chunks(),
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 200
+    summary = response.json()
+    assert (summary["inserted"], summary["updated"], summary["rejected"]) == (3, 1, 2)
+    assert [e["line"] for e in summary["errors"]] == [3, 6]
+
+    # Кэш сброшен один раз в конце, список видит все изменения
+    assert await redis_mock.get("products:0:100") is None
+    products = {p["id"]: p for p in (await ac.get("/api/products")).json()}
+    assert products[existing_id]["name"] == "New name"
+    assert products[500]["name"] == "Monitor"
+    assert len(products) == 4
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_csv(ac):
+    token = await get_token(ac, email="csv@test.com")
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "text/csv"}
+
+    body = 'name,price,id\n"Desk, oak",120,\nChair,abc,\nLamp,25,\n'
+    response = await ac.post("/api/products/bulk", content=body, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 2
+    assert response.json()["rejected"] == 1
+    names = {p["name"] for p in (await ac.get("/api/products")).json()}
+    assert names == {"Desk, oak", "Lamp"}
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_rejects_too_long_lines(ac, monkeypatch):
+    from app import product_import
+
+    monkeypatch.setattr(product_import, "PRODUCT_IMPORT_MAX_LINE_LENGTH", 40)
+    token = await get_token(ac, email="long@test.com")
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/x-ndjson"}
+
+    long_line = json.dumps({"name": "x" * 100, "price": 1})
+    desk, lamp = json.dumps({"name": "Desk", "price": 120}), json.dumps({"name": "Lamp", "price": 25})
+    body = "\n".join([desk, long_line, lamp, long_line])
+
+    async def chunks():
+        data = body.encode()
+        for i in range(0, len(data), 7):
+            yield data[i : i + 7]
+
+    response = await ac.post("/api/products/bulk", content=chunks(), headers=headers)
+
+    # Длинная строка отвергается, соседние строки импортируются
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 2
+    assert [(e["line"], e["detail"]) for e in response.json()["errors"]] == [
+        (2, "Line too long"),
+        (4, "Line too long"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_rows_without_id_do_not_take_explicit_ids(ac):
+    token = await get_token(ac, email="ids@test.com")
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "text/csv"}
+
+    # Строка без id идет раньше строки с id 1 в той же пачке
+    body = "name,price,id\nDesk,120,\nLamp,25,1\n"
+    response = await ac.post("/api/products/bulk", content=body, headers=headers)
+
+    assert (response.json()["inserted"], response.json()["updated"]) == (2, 0)
+    products = {p["id"]: p["name"] for p in (await ac.get("/api/products")).json()}
+    assert products[1] == "Lamp"
+    assert set(products.values()) == {"Desk", "Lamp"}
+
+
+@pytest.mark.asyncio
+async def test_export_products_streams_all_rows(ac, redis_mock, monkeypatch):
+    from app import export
+
+    monkeypatch.setattr(export, "EXPORT_FETCH_SIZE", 2)
+    token = await get_token(ac, email="exporter@test.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(5):
+        await ac.post("/api/products", json={"name": f"Item {i}", "price": i + 1}, headers=headers)
+
+    response = await ac.get("/api/products/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["name"] for r in rows] == [f"Item {i}" for i in range(5)]
+    # Выгрузка не оставляет ключей в кэше
+    assert await redis_mock.keys("products:*") == []
+
+    response = await ac.get("/api/products/export?format=csv")
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0] == "id,name,price"
+    assert len(lines) == 6
+
+
+@pytest.mark.asyncio
+async def test_products_conditional_get(ac, db_session, redis_mock):
+    token = await get_token(ac, email="etag@test.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    create = await ac.post("/api/products", json={"name": "Lamp", "price": 5}, headers=headers)
+
+    first = await ac.get("/api/products")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"].startswith("public")
+
+    statements = []
+    sync_engine = db_session.bind.sync_engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(sync_engine, "before_cursor_execute", listener)
+    try:
+        await redis_mock.delete("products:0:100")
+        cached = await ac.get("/api/products", headers={"If-None-Match": etag})
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", listener)
+
+    # 304 без тела, без запроса к БД и без перезаполнения кэша
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["ETag"] == etag
+    assert statements == []
+    assert await redis_mock.get("products:0:100") is None
+
+    await ac.put(
+        f"/api/products/{create.json()['id']}", json={"name": "Lamp 2"}, headers=headers
+    )
+    changed = await ac.get("/api/products", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["name"] == "Lamp 2"
+
+    # Счетчик после потери Redis не начинается с нуля и не повторяет старый ETag
+    await redis_mock.flushall()
+    after_flush = await ac.get("/api/products", headers={"If-None-Match": etag})
+    assert after_flush.status_code == 200
+    assert after_flush.headers["ETag"] not in (etag, changed.headers["ETag"])
+
+
+@pytest.mark.asyncio
+async def test_read_product_cache_follows_updates(ac, redis_mock):
+    token = await get_token(ac, email="reader@test.com")
+    headers = {"Authorization": f"Bearer {token}"}
+    p_id = (
+        await ac.post("/api/products", json={"name": "Chair", "price": 40}, headers=headers)
+    ).json()["id"]
+
+    assert (await ac.get(f"/api/products/{p_id}")).json()["name"] == "Chair"
+    assert await redis_mock.hgetall(f"product_row:{p_id}") == {"name": "Chair", "price": "40.0"}
+
+    await ac.put(f"/api/products/{p_id}", json={"name": "Armchair"}, headers=headers)
+    assert (await ac.get(f"/api/products/{p_id}")).json()["name"] == "Armchair"
+
+    await ac.delete(f"/api/products/{p_id}", headers=headers)
+    assert (await ac.get(f"/api/products/{p_id}")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_product_writes_are_single_statements(ac, query_counter):
+    headers = {"Authorization": f"Bearer {await get_token(ac)}"}
+    # Прогрев кэша пользователей, чтобы считать только запросы записи
+    await ac.get("/api/orders", headers=headers)
+
+    with query_counter() as queries:
+        created = await ac.post(
+            "/api/products", json={"name": "Laptop", "price": 1000}, headers=headers
+        )
+    assert created.status_code == 201
+    assert len(queries) == 1 and queries[0].startswith("INSERT INTO products")
+    product_id = created.json()["id"]
+
+    with query_counter() as queries:
+        updated = await ac.put(
+            f"/api/products/{product_id}", json={"price": 900}, headers=headers
+        )
+        missing = await ac.put("/api/products/999", json={"price": 1}, headers=headers)
+    assert updated.json() == {"id": product_id, "name": "Laptop", "price": 900}
+    assert missing.status_code == 404
+    assert len(queries) == 2 and all(q.startswith("UPDATE products") for q in queries)
+
+    # Пустое изменение ничего не пишет
+    unchanged = await ac.put(f"/api/products/{product_id}", json={}, headers=headers)
+    assert unchanged.json()["price"] == 900
+
+    with query_counter() as queries:
+        deleted = await ac.delete(f"/api/products/{product_id}", headers=headers)
+    assert deleted.status_code == 204
+    assert len(queries) == 1 and queries[0].startswith("DELETE FROM products")
+
+
+@pytest.mark.asyncio
+async def test_search_products(ac, redis_mock):
+    headers = {"Authorization": f"Bearer {await get_token(ac)}"}
+    for name in ("Laptop Pro 14", "Laptop Air", "Gaming laptop", "Phone Pro"):
+        await ac.post("/api/products", json={"name": name, "price": 100}, headers=headers)
+
+    response = await ac.get("/api/products/search", params={"q": "lap"})
+    assert [p["name"] for p in response.json()] == ["Laptop Pro 14", "Laptop Air", "Gaming laptop"]
+
+    # Каждое слово - префикс; точные совпадения слов выше
+    response = await ac.get("/api/products/search", params={"q": "  PRO!  laptop "})
+    assert [p["name"] for p in response.json()] == ["Laptop Pro 14"]
+    assert await redis_mock.exists("product_search:20:pro laptop")
+    assert (await ac.get("/api/products/search", params={"q": "?!"})).json() == []
+
+    # Любая запись товаров сбрасывает кэш результатов и локальный индекс
+    phone_id = (await ac.get("/api/products/search", params={"q": "phone"})).json()[0]["id"]
+    await ac.put(f"/api/products/{phone_id}", json={"name": "Laptop Pro 16"}, headers=headers)
+    assert not await redis_mock.exists("product_search:20:pro laptop")
+    response = await ac.get("/api/products/search", params={"q": "laptop pro"})
+    assert [p["name"] for p in response.json()] == ["Laptop Pro 14", "Laptop Pro 16"]
+    assert (await ac.get("/api/products/search", params={"q": "phone"})).json() == []
+
+
+@pytest.mark.asyncio
+async def test_search_splits_words_like_postgres(ac):
+    headers = {"Authorization": f"Bearer {await get_token(ac)}"}
+    for name in ("Wi-Fi Router", "O'Reilly Book", "USB_C Cable", "PS5 Console"):
+        await ac.post("/api/products", json={"name": name, "price": 100}, headers=headers)
+
+    async def names(q):
+        response = await ac.get("/api/products/search", params={"q": q})
+        return [p["name"] for p in response.json()]
+
+    # Только то, что совпадает с частями слов to_tsvector('simple') в PostgreSQL
+    assert await names("wi-fi") == ["Wi-Fi Router"]
+    assert await names("fi router") == ["Wi-Fi Router"]
+    assert await names("reilly") == ["O'Reilly Book"]
+    assert await names("usb c") == ["USB_C Cable"]
+    assert await names("ps") == ["PS5 Console"]
+    # Цифры внутри слова не отдельное слово
+    assert await names("5") == []
+
+
+@pytest.mark.asyncio
+async def test_product_price_filter_and_sort(ac, redis_mock):
+    headers = {"Authorization": f"Bearer {await get_token(ac)}"}
+    prices = {"Cable": 5, "Mouse": 20, "Keyboard": 20, "Monitor": 300, "Laptop": 1000}
+    ids = {}
+    for name, price in prices.items():
+        response = await ac.post(
+            "/api/products", json={"name": name, "price": price}, headers=headers
+        )
+        ids[name] = response.json()["id"]
+
+    async def walk(params):
+        names, cursor = [], None
+        while True:
+            page = await ac.get(
+                "/api/products", params={**params, "limit": 2, **({"cursor": cursor} if cursor else {})}
+            )
+            assert page.status_code == 200
+            names += [p["name"] for p in page.json()]
+            cursor = page.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return names
+
+    # Одинаковые цены упорядочены по id, и страницы на границе их не теряют
+    assert await walk({"sort": "price"}) == ["Cable", "Mouse", "Keyboard", "Monitor", "Laptop"]
+    assert await walk({"sort": "-price"}) == ["Laptop", "Monitor", "Keyboard", "Mouse", "Cable"]
+    assert await walk({"sort": "name"}) == ["Cable", "Keyboard", "Laptop", "Monitor", "Mouse"]
+    assert await walk({"sort": "price", "min_price": 10, "max_price": 300}) == [
+        "Mouse", "Keyboard", "Monitor"
+    ]
+    # Границы округляются до копеек: эквивалентный фильтр попадает в тот же ключ
+    assert await redis_mock.exists("products:price:-:-:0:2")
+    assert await redis_mock.exists("products:price:10.00:300.00:0:2")
+    same = await ac.get(
+        "/api/products", params={"sort": "price", "min_price": 10.001, "max_price": 300, "limit": 2}
+    )
+    assert [p["name"] for p in same.json()] == ["Mouse", "Keyboard"]
+    assert not await redis_mock.keys("products:price:10.001*")
+
+    # Глубокие страницы по skip не кэшируются
+    deep = await ac.get("/api/products", params={"sort": "price", "skip": 5000, "limit": 2})
+    assert deep.json() == []
+    assert not await redis_mock.keys("products:price:*:5000:*")
+
+    # Слишком большой limit урезается до максимума, а не отвергается
+    too_large = await ac.get("/api/products", params={"limit": 1000})
+    assert too_large.status_code == 200
+    assert len(too_large.json()) == len(prices)
+    assert await redis_mock.exists("products:0:100")
+    assert not await redis_mock.exists("products:0:1000")
+
+    # Курсор от сортировки по id не подходит к сортировке по цене
+    by_id = await ac.get("/api/products", params={"limit": 2})
+    mismatched = await ac.get(
+        "/api/products", params={"sort": "price", "cursor": by_id.headers["X-Next-Cursor"]}
+    )
+    assert mismatched.status_code == 400
+
+    # Изменение цены переносит товар между страницами сортировки и фильтра
+    await ac.put(f"/api/products/{ids['Laptop']}", json={"price": 100}, headers=headers)
+    assert not await redis_mock.exists("products:price:-:-:0:2")
+    assert not await redis_mock.exists("products:price:10.00:300.00:0:2")
+    assert await walk({"sort": "price", "min_price": 10, "max_price": 300}) == [
+        "Mouse", "Keyboard", "Laptop", "Monitor"
+    ]
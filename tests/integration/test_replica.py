@@ -0,0 +1,94 @@
+import json
+
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app import replica
+from app.database import Base
+from app.models import Product
+from app.replica import ReplicaMonitor
+
+
+@pytest.fixture
+async def replica_db(monkeypatch):
+    """Отдельная in-memory БД в роли реплики, с собственными данными"""
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Product), [{"name": "From replica", "price": 1}])
+
+    monitor = ReplicaMonitor(engine, max_lag=5)
+    await monitor.check()
+    monkeypatch.setattr(replica, "replica_monitor", monitor)
+    yield monitor
+    await engine.dispose()
+
+
+async def exported_names(ac, headers=None):
+    response = await ac.get("/api/products/export", headers=headers)
+    return [json.loads(line)["name"] for line in response.text.splitlines()]
+
+
+async def login(ac, email="writer@test.com"):
+    await ac.post("/api/register", json={"email": email, "password": "pass"})
+    resp = await ac.post("/api/login", data={"username": email, "password": "pass"})
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_except_after_own_write(ac, redis_mock, replica_db):
+    headers = await login(ac)
+    await ac.post("/api/products", json={"name": "From primary", "price": 2}, headers=headers)
+
+    # Анонимные чтения и чтения других пользователей идут в реплику
+    assert await exported_names(ac) == ["From replica"]
+    assert await exported_names(ac, await login(ac, "reader@test.com")) == ["From replica"]
+
+    # Автор записи видит свои изменения
+    assert await exported_names(ac, headers) == ["From primary"]
+
+    # Окно истекло: снова реплика
+    await redis_mock.delete("recent_write:writer@test.com")
+    assert await exported_names(ac, headers) == ["From replica"]
+    assert replica_db.stats == {"replica_reads": 3, "primary_reads": 1}
+
+
+@pytest.mark.asyncio
+async def test_lagging_or_broken_replica_falls_back_to_primary(ac, db_session, replica_db):
+    await db_session.execute(insert(Product), [{"name": "From primary", "price": 2}])
+    await db_session.commit()
+
+    replica_db.lag = 60
+    assert await exported_names(ac) == ["From primary"]
+
+    broken = ReplicaMonitor(create_async_engine("sqlite+aiosqlite:////nonexistent/dir/r.db"))
+    await broken.check()
+    assert broken.healthy is False
+    assert broken.available is False
+
+
+@pytest.mark.asyncio
+async def test_cache_is_not_filled_from_replica_after_catalog_write(
+    ac, redis_mock, replica_db
+):
+    headers = await login(ac)
+    # В основной БД товар 1 уже переименован, реплика еще отдает старое имя
+    await ac.post("/api/products", json={"name": "Old name", "price": 1}, headers=headers)
+    await ac.put("/api/products/1", json={"name": "New name"}, headers=headers)
+
+    # Анонимные чтения заполняют общие кэши: они не должны уйти в реплику
+    assert (await ac.get("/api/products/1")).json()["name"] == "New name"
+    assert [p["name"] for p in (await ac.get("/api/products")).json()] == ["New name"]
+    assert await redis_mock.hget("product_row:1", "name") == "New name"
+    assert replica_db.stats["replica_reads"] == 0
+
+    # Окно истекло: реплика снова обслуживает каталог
+    await redis_mock.delete("recent_write:catalog")
+    await ac.get("/api/products", params={"limit": 5})
+    assert replica_db.stats["replica_reads"] == 1
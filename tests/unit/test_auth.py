@@ -1,28 +1,37 @@
-from unittest.mock import AsyncMock, patch
+import json
 
 import pytest
+from sqlalchemy import event, select
+
+from app import dependencies
+from app.dependencies import principal_cache, principal_invalidator
+from app.models import OutboxEvent, User
 
 
 @pytest.mark.asyncio
-async def test_register_user(ac):
-    """Тест регистрации и отправки события в RabbitMQ"""
+async def test_register_user(ac, db_session, query_counter):
+    """Тест регистрации и записи события для RabbitMQ в outbox"""
     user_data = {"email": "test@example.com", "password": "password123"}
 
-    # Мокаем send_message внутри роутера auth
-    with patch(
-        "app.routers.auth.send_message", new_callable=AsyncMock
-    ) as mock_send_message:
+    with query_counter() as queries:
         response = await ac.post("/api/register", json=user_data)
 
-        assert response.status_code == 201
-        data = response.json()
-        assert data["email"] == user_data["email"]
-        assert "id" in data
+    assert response.status_code == 201
+    data = response.json()
+    assert data["email"] == user_data["email"]
+    assert data["is_active"] is True
+    assert "id" in data
+    # Проверка email, пользователь и событие outbox, без SELECT после commit
+    assert [q.split()[:3] for q in queries] == [
+        ["SELECT", "users.id,", "users.email,"],
+        ["INSERT", "INTO", "users"],
+        ["INSERT", "INTO", "outbox"],
+    ]
 
-        # Проверяем, что сообщение было отправлено в очередь
-        mock_send_message.assert_called_once()
-        assert mock_send_message.call_args[1]["event_type"] == "user_registered"
-        assert mock_send_message.call_args[1]["data"]["email"] == user_data["email"]
+    # Проверяем, что событие записано в outbox вместе с пользователем
+    event = (await db_session.execute(select(OutboxEvent))).scalar_one()
+    assert event.event_type == "user_registered"
+    assert event.payload["email"] == user_data["email"]
 
 
 @pytest.mark.asyncio
@@ -37,3 +46,85 @@ async def test_login_user(ac):
     assert response.status_code == 200
     assert "access_token" in response.json()
     assert response.json()["token_type"] == "bearer"
+
+
+async def login(ac, email):
+    await ac.post("/api/register", json={"email": email, "password": "pass"})
+    resp = await ac.post("/api/login", data={"username": email, "password": "pass"})
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+
+@pytest.mark.asyncio
+async def test_authenticated_user_is_cached(ac, db_session):
+    headers = await login(ac, "cached@test.com")
+
+    queries = []
+
+    def count_user_selects(conn, cursor, statement, *args):
+        if "FROM users" in statement:
+            queries.append(statement)
+
+    sync_engine = db_session.bind.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", count_user_selects)
+    try:
+        for _ in range(3):
+            assert (await ac.get("/api/orders", headers=headers)).status_code == 200
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", count_user_selects)
+
+    assert len(queries) == 1
+    assert principal_cache.get("cached@test.com").email == "cached@test.com"
+
+
+@pytest.mark.asyncio
+async def test_deactivated_user_is_evicted(ac, db_session):
+    headers = await login(ac, "inactive@test.com")
+    assert (await ac.get("/api/orders", headers=headers)).status_code == 200
+
+    user = (
+        await db_session.execute(select(User).where(User.email == "inactive@test.com"))
+    ).scalar_one()
+    user.is_active = False
+    await db_session.commit()
+
+    response = await ac.get("/api/orders", headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Inactive user"
+
+
+@pytest.mark.asyncio
+async def test_deactivation_is_broadcast_after_commit(
+    ac, db_session, redis_mock, monkeypatch
+):
+    monkeypatch.setattr(dependencies, "AUTH_CACHE_REDIS", True)
+    email = "shared@test.com"
+    headers = await login(ac, email)
+    assert (await ac.get("/api/orders", headers=headers)).status_code == 200
+    assert await redis_mock.exists(f"principal:{email}")
+
+    # Другой воркер слушает канал сброса
+    other_worker = redis_mock.pubsub(ignore_subscribe_messages=True)
+    await other_worker.subscribe("principal_invalidations")
+    principal_invalidator.start(redis_mock)
+    try:
+        user = (
+            await db_session.execute(select(User).where(User.email == email))
+        ).scalar_one()
+        user.is_active = False
+        # До commit ни одна копия не сбрасывается
+        assert principal_cache.get(email) is not None
+
+        await db_session.commit()
+        message = None
+        for _ in range(50):
+            message = await other_worker.get_message(timeout=0.01)
+            if message is not None:
+                break
+    finally:
+        # Слушатель останавливается флагом между опросами, без отмены чтения
+        await principal_invalidator.stop(timeout=2)
+        await other_worker.aclose()
+
+    assert json.loads(message["data"]) == [email]
+    assert principal_cache.get(email) is None
+    assert not await redis_mock.exists(f"principal:{email}")
@@ -0,0 +1,30 @@
+import pytest
+
+from app.broker import QUEUE_NAME, publisher, send_message
+
+
+@pytest.mark.asyncio
+async def test_send_message_reuses_connection(mock_rabbitmq):
+    """Соединение и объявление очереди происходят один раз на несколько отправок"""
+    for i in range(3):
+        await send_message(event_type="order_created", data={"id": i})
+
+    mock_rabbitmq.connect_robust.assert_awaited_once()
+
+    connection = mock_rabbitmq.connect_robust.return_value
+    for call in connection.channel.call_args_list:
+        assert call.kwargs["publisher_confirms"] is True
+
+    channel = connection.channel.return_value
+    channel.declare_queue.assert_awaited_once_with(QUEUE_NAME, durable=True)
+    assert channel.default_exchange.publish.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_publisher_close_resets_state(mock_rabbitmq):
+    await publisher.start()
+    assert publisher.is_started
+
+    await publisher.close()
+    assert not publisher.is_started
+    mock_rabbitmq.connect_robust.return_value.close.assert_awaited_once()
@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+import pytest
+
+from app import cache
+
+
+@pytest.mark.asyncio
+async def test_redis_clients_share_one_pool():
+    first = await cache.get_redis_client()
+    second = await cache.get_redis_client()
+
+    assert first.connection_pool is second.connection_pool
+    assert cache.get_redis_pool_stats() == {
+        "max_connections": cache.REDIS_MAX_CONNECTIONS,
+        "in_use": 0,
+        "idle": 0,
+    }
+
+    await cache.close_redis_pool()
+    third = await cache.get_redis_client()
+    assert third.connection_pool is not first.connection_pool
+    await cache.close_redis_pool()
+
+
+def counting_loader(value="[]", delay=0.01):
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        return value, []
+
+    return loader, calls
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_collapses_concurrent_misses(redis_mock):
+    loader, calls = counting_loader('["fresh"]')
+
+    results = await asyncio.gather(
+        *(cache.get_or_set(redis_mock, "hot", loader, ttl=60) for _ in range(50))
+    )
+
+    assert calls == [1]
+    assert set(results) == {'["fresh"]'}
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_serves_stale_while_one_refreshes(redis_mock):
+    await redis_mock.set("hot", '["stale"]')
+    await redis_mock.set("hot:meta", f"{time.time() - 1}:0.01")
+    loader, calls = counting_loader('["fresh"]')
+
+    results = await asyncio.gather(
+        *(cache.get_or_set(redis_mock, "hot", loader, ttl=60) for _ in range(20))
+    )
+
+    assert calls == [1]
+    assert results.count('["fresh"]') == 1
+    assert results.count('["stale"]') == 19
+    assert await redis_mock.get("hot") == '["fresh"]'
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_waits_for_other_process(redis_mock, monkeypatch):
+    monkeypatch.setattr(cache, "CACHE_LOCK_POLL_INTERVAL", 0.01)
+    # Блокировку держит другой процесс, который вскоре запишет значение
+    await redis_mock.set("lock:hot", "other-process")
+    loader, calls = counting_loader()
+
+    async def other_process():
+        await asyncio.sleep(0.03)
+        await redis_mock.set("hot", '["from other"]')
+
+    result, _ = await asyncio.gather(
+        cache.get_or_set(redis_mock, "hot", loader, ttl=60), other_process()
+    )
+
+    assert result == '["from other"]'
+    assert calls == []
+
+
+def test_early_expiration_is_probabilistic():
+    now = time.time()
+    # Далеко до истечения - никогда не обновляем, после истечения - всегда
+    assert not cache._should_refresh(now + 60, 0.01, beta=1.0)
+    assert cache._should_refresh(now - 1, 0.01, beta=1.0)
+    # Дорогой пересчет около границы почти всегда запускается заранее
+    refreshes = sum(cache._should_refresh(now + 0.1, 10, beta=1.0) for _ in range(100))
+    assert refreshes > 90
+
+
+def test_lru_cache_evicts_and_expires(monkeypatch):
+    lru = cache.LRUCache(maxsize=2, ttl=10)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+
+    # "b" использовался давнее всех
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now + 11)
+    assert lru.get("a") is None
+    assert len(lru) == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidation_listener_stop_is_bounded(redis_mock):
+    received = []
+    listener = cache.InvalidationListener("changes", received.append, lambda: None, 0.01)
+    listener.start(redis_mock)
+    for _ in range(50):
+        if dict(await redis_mock.pubsub_numsub("changes"))["changes"]:
+            break
+        await asyncio.sleep(0.01)
+    await redis_mock.publish("changes", "[1]")
+    for _ in range(50):
+        if received:
+            break
+        await asyncio.sleep(0.01)
+    assert received == [[1]]
+
+    started = time.monotonic()
+    await listener.stop(timeout=1)
+    assert time.monotonic() - started < 0.5
+    assert not listener.running
+
+    # Чтение, которое не возвращается: остановка все равно ограничена таймаутом
+    class StuckPubSub:
+        connection = None
+
+        async def subscribe(self, channel):
+            pass
+
+        async def get_message(self, timeout):
+            await asyncio.Event().wait()
+
+        async def aclose(self):
+            pass
+
+    class StuckRedis:
+        def pubsub(self, **kwargs):
+            return StuckPubSub()
+
+    listener.start(StuckRedis())
+    await asyncio.sleep(0.01)
+    started = time.monotonic()
+    await listener.stop(timeout=0.05)
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,139 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+
+from worker.consumer import Consumer, HandlerRegistry
+
+
+class FakeMessage:
+    def __init__(self, body):
+        self.body = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.headers = {}
+        self.ack = AsyncMock()
+        self.nack = AsyncMock()
+
+
+def event(event_type, **data):
+    return FakeMessage({"event": event_type, "data": data})
+
+
+@pytest.fixture
+def dead_letter():
+    return AsyncMock()
+
+
+@pytest.mark.asyncio
+async def test_consumer_routes_events_to_registered_handlers(dead_letter):
+    registry = HandlerRegistry()
+    single, batches = [], []
+
+    @registry.register("user_registered")
+    async def on_user(data):
+        single.append(data["id"])
+
+    @registry.register("order_created", batch_size=10)
+    async def on_orders(events):
+        batches.append([data["id"] for data in events])
+
+    consumer = Consumer(registry, dead_letter, concurrency=2, batch_timeout=0.01)
+    consumer.start()
+
+    messages = [event("user_registered", id=1)] + [
+        event("order_created", id=i) for i in range(5)
+    ]
+    for message in messages:
+        await consumer.on_message(message)
+    await consumer.drain()
+
+    assert single == [1]
+    # Заказы пришли микропачками, а не по одному
+    assert sorted(sum(batches, [])) == [0, 1, 2, 3, 4]
+    assert len(batches) < 5
+    assert all(message.ack.await_count == 1 for message in messages)
+    dead_letter.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_consumer_dead_letters_poison_messages(dead_letter):
+    registry = HandlerRegistry()
+
+    @registry.register("order_created", batch_size=10)
+    async def on_orders(events):
+        if any(data["id"] == 2 for data in events):
+            raise ValueError("bad order")
+
+    consumer = Consumer(registry, dead_letter, concurrency=1, batch_timeout=0.01)
+    consumer.start()
+
+    broken = FakeMessage(b"not json")
+    poison = event("order_created", id=2)
+    good = [event("order_created", id=1), event("order_created", id=3)]
+    for message in [broken, good[0], poison, good[1]]:
+        await consumer.on_message(message)
+    await consumer.drain()
+
+    # В dead letter уходят только сломанные сообщения, остальные обработаны
+    assert [call.args[0] for call in dead_letter.await_args_list] == [broken, poison]
+    assert consumer.processed == 2
+    assert consumer.dead_lettered == 2
+    assert all(m.ack.await_count == 1 for m in [broken, poison, *good])
+
+
+@pytest.mark.asyncio
+async def test_consumer_drain_waits_for_in_flight_work(dead_letter):
+    registry = HandlerRegistry()
+    finished = []
+
+    @registry.register("user_registered")
+    async def slow(data):
+        await asyncio.sleep(0.05)
+        finished.append(data["id"])
+
+    consumer = Consumer(registry, dead_letter, concurrency=2)
+    consumer.start()
+    for i in range(4):
+        await consumer.on_message(event("user_registered", id=i))
+
+    await consumer.drain()
+    assert sorted(finished) == [0, 1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_consumer_survives_dead_letter_and_ack_failures():
+    registry = HandlerRegistry()
+    handled = []
+
+    @registry.register("user_registered")
+    async def on_user(data):
+        if data["id"] == 0:
+            raise ValueError("bad user")
+        handled.append(data["id"])
+
+    @registry.register("order_created", batch_size=10)
+    async def on_orders(events):
+        handled.extend(data["id"] for data in events)
+
+    dead_letter = AsyncMock(side_effect=ConnectionError("channel closed"))
+    consumer = Consumer(registry, dead_letter, concurrency=1, batch_timeout=0.01)
+    consumer.start()
+
+    poison = event("user_registered", id=0)
+    unacked = event("order_created", id=1)
+    unacked.ack.side_effect = ConnectionError("channel closed")
+    good = [event("user_registered", id=2), event("order_created", id=3)]
+    for message in [poison, unacked, *good]:
+        await consumer.on_message(message)
+    await asyncio.sleep(0.05)
+
+    # Обработчики живы и обрабатывают следующие сообщения
+    assert not any(worker.done() for worker in consumer._workers)
+    await consumer.drain()
+
+    assert sorted(handled) == [1, 2, 3]
+    # Сообщение без копии в dead letter возвращено в очередь, а не подтверждено
+    poison.ack.assert_not_called()
+    poison.nack.assert_awaited_once_with(requeue=True)
+    assert consumer.dead_lettered == 0
+    assert all(m.ack.await_count == 1 for m in good)
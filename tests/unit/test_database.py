@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import database
+
+
+def test_engine_options_for_postgres(monkeypatch):
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 5000)
+    options = database.engine_options("postgresql+asyncpg://u:p@db/shop")
+
+    assert options["echo"] is False
+    assert options["poolclass"] is database.TimedQueuePool
+    assert options["pool_size"] == database.DB_POOL_SIZE
+    assert options["connect_args"] == {
+        "statement_cache_size": database.DB_STATEMENT_CACHE_SIZE,
+        "server_settings": {"statement_timeout": "5000"},
+    }
+    assert "poolclass" not in database.engine_options("sqlite+aiosqlite://")
+
+
+@pytest.mark.asyncio
+async def test_pool_counts_checkout_waits(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path}/pool.db",
+        poolclass=database.TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    pool = engine.sync_engine.pool
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            assert pool.checkedout() == 1
+            # Единственное соединение занято: второй запрос ждет и получает таймаут
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect():
+                    pass
+    finally:
+        await engine.dispose()
+
+    assert pool.wait_stats["checkouts"] == 2
+    assert pool.wait_stats["timeouts"] == 1
+    assert pool.wait_stats["wait_seconds_max"] >= 0.1
@@ -24,3 +24,18 @@ def test_order_validation():
 
     with pytest.raises(ValidationError):
         OrderCreate(product_id=1, quantity=-1)
+
+
+def test_cached_page_round_trip():
+    from app.pagination import decode_cursor, encode_cursor, pack_page, page_response
+
+    body = b'[{"name":"A","price":1.0,"id":7}]'
+    cursor = encode_cursor(id=7)
+
+    # Из Redis значение приходит строкой, из single-flight - байтами
+    for cached in (pack_page(body, cursor), pack_page(body, cursor).decode()):
+        response = page_response(cached)
+        assert response.body == body
+        assert decode_cursor(response.headers["X-Next-Cursor"]) == {"id": 7}
+
+    assert "X-Next-Cursor" not in page_response(pack_page(body, None)).headers
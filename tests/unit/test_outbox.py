@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import OutboxEvent
+from app.outbox import OutboxRelay, add_event
+
+
+class StandInPublisher:
+    """Локальная замена брокера: запоминает события или падает по требованию"""
+
+    def __init__(self, fail_events=()):
+        self.fail_events = set(fail_events)
+        self.published = []
+
+    async def publish(self, event_type, data):
+        if event_type in self.fail_events:
+            raise ConnectionError("broker is down")
+        self.published.append((event_type, data))
+
+
+@pytest.fixture
+def session_factory(db_session):
+    return async_sessionmaker(db_session.bind, class_=AsyncSession, expire_on_commit=False)
+
+
+async def add_events(db_session, *event_types):
+    for i, event_type in enumerate(event_types):
+        add_event(db_session, event_type, {"id": i})
+    await db_session.commit()
+
+
+@pytest.mark.asyncio
+async def test_relay_publishes_in_batches(db_session, session_factory):
+    await add_events(db_session, *["order_created"] * 5)
+    publisher = StandInPublisher()
+    relay = OutboxRelay(session_factory, publisher, batch_size=2)
+
+    assert [await relay.drain_once() for _ in range(4)] == [2, 2, 1, 0]
+
+    assert [data["id"] for _, data in publisher.published] == [0, 1, 2, 3, 4]
+    assert relay.stats["published"] == 5
+    assert relay.stats["batches"] == 3
+
+    events = (await db_session.execute(select(OutboxEvent))).scalars().all()
+    for event in events:
+        await db_session.refresh(event)
+    assert all(event.sent_at is not None for event in events)
+
+
+@pytest.mark.asyncio
+async def test_relay_retries_failed_events_with_backoff(db_session, session_factory):
+    await add_events(db_session, "user_registered", "order_created")
+    publisher = StandInPublisher(fail_events={"order_created"})
+    relay = OutboxRelay(session_factory, publisher)
+
+    assert await relay.drain_once() == 2
+    assert relay.stats["failed"] == 1
+
+    failed = (
+        await db_session.execute(
+            select(OutboxEvent).where(OutboxEvent.event_type == "order_created")
+        )
+    ).scalar_one()
+    await db_session.refresh(failed)
+    assert failed.sent_at is None
+    assert failed.attempts == 1
+    assert failed.last_error == "broker is down"
+    assert failed.next_attempt_at > datetime.utcnow()
+
+    # Пока не прошла задержка, событие не берется повторно
+    assert await relay.drain_once() == 0
@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event, insert, update
+
+from app.models import Product
+from app.product_cache import ProductCache
+
+
+def count_product_queries(db_session):
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        if "FROM products" in statement:
+            statements.append(statement)
+
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    return statements, lambda: event.remove(
+        db_session.bind.sync_engine, "before_cursor_execute", listener
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_many_loads_misses_with_one_query(db_session, redis_mock):
+    await db_session.execute(
+        insert(Product), [{"name": f"Item {i}", "price": i} for i in range(1, 4)]
+    )
+    await db_session.commit()
+
+    cache = ProductCache()
+    statements, stop = count_product_queries(db_session)
+    try:
+        products = await cache.get_many(db_session, redis_mock, [1, 2, 3, 99])
+        assert sorted(products) == [1, 2, 3]
+        assert len(statements) == 1
+
+        # Второй запрос целиком из LRU
+        await cache.get_many(db_session, redis_mock, [1, 2, 3])
+        # Другой воркер с пустым LRU читает из Redis
+        other = ProductCache()
+        assert (await other.get(db_session, redis_mock, 2)).name == "Item 2"
+        assert len(statements) == 1
+    finally:
+        stop()
+
+    assert cache.stats == {"local_hits": 3, "redis_hits": 0, "misses": 4}
+    assert other.stats["redis_hits"] == 1
+    assert cache.hit_ratio == round(3 / 7, 4)
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers(db_session, redis_mock):
+    await db_session.execute(insert(Product), [{"name": "Phone", "price": 500}])
+    await db_session.commit()
+
+    writer, reader = ProductCache(), ProductCache()
+    await reader.get(db_session, redis_mock, 1)
+    assert reader.local.get(1) is not None
+
+    reader.start(redis_mock)
+    try:
+        # Даем подписчику подписаться на канал
+        await asyncio.sleep(0.05)
+        await writer.invalidate(redis_mock, 1)
+        for _ in range(50):
+            if reader.local.get(1) is None:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await reader.stop()
+
+    assert reader.local.get(1) is None
+    assert await redis_mock.exists("product_row:1") == 0
+
+
+@pytest.mark.asyncio
+async def test_load_racing_with_invalidation_does_not_store_stale_row(
+    db_session, redis_mock
+):
+    await db_session.execute(insert(Product), [{"name": "Phone", "price": 500}])
+    await db_session.commit()
+    reader, writer = ProductCache(), ProductCache()
+
+    class UpdatedDuringLoad:
+        """Строка прочитана, и до записи в кэш товар меняет другой воркер"""
+
+        async def execute(self, statement):
+            result = await db_session.execute(statement)
+            await db_session.execute(update(Product).values(price=450))
+            await db_session.commit()
+            await writer.invalidate(redis_mock, 1)
+            return result
+
+    stale = await reader.get(UpdatedDuringLoad(), redis_mock, 1)
+    assert stale.price == 500
+    assert await redis_mock.exists("product_row:1") == 0
+    assert reader.local.get(1) is None
+
+    assert (await reader.get(db_session, redis_mock, 1)).price == 450
+    assert await redis_mock.hget("product_row:1", "price") == "450.0"